@@ -1,11 +1,1626 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 from PIL import Image, ImageTk
+import numpy as np
 import os
 import json
+import socket
+import sqlite3
+import threading
+import time
+import argparse
+import asyncio
+import bisect
+import csv
+import hashlib
+import io
+import multiprocessing
+import random
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
 import xml.etree.ElementTree as ET
+from array import array
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+class LeaseConflictError(Exception):
+    """Raised when an image is leased to another labeler instance"""
+
+class WorkQueue:
+    """Shared image work queue that leases images to labeler instances
+
+    Leases live in a local SQLite file next to the labeled data, so any number
+    of labeler processes pointed at the same folders can coordinate without a
+    server. A lease expires after ``lease_seconds`` unless it is renewed, so a
+    crashed instance never blocks an image for long.
+    """
+
+    def __init__(self, db_path, owner, lease_seconds=600):
+        self.db_path = db_path
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        # Autocommit mode so every lease change runs in an explicit short transaction
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "image TEXT PRIMARY KEY, "
+            "owner TEXT NOT NULL, "
+            "expires REAL NOT NULL)"
+        )
+
+    def holder(self, image):
+        """Return the owner of an active lease on image, or None"""
+        row = self.conn.execute(
+            "SELECT owner FROM leases WHERE image = ? AND expires > ?",
+            (image, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def leases(self):
+        """Return {image: owner} for every active lease"""
+        return dict(self.conn.execute(
+            "SELECT image, owner FROM leases WHERE expires > ?", (time.time(),)
+        ).fetchall())
+
+    def acquire(self, image):
+        """Lease image to this instance, releasing any other lease it holds"""
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front so check-and-set is atomic
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT owner FROM leases WHERE image = ? AND expires > ?",
+                (image, now)
+            ).fetchone()
+            if row and row[0] != self.owner:
+                self.conn.execute("ROLLBACK")
+                return False
+            
+            self.conn.execute(
+                "INSERT OR REPLACE INTO leases (image, owner, expires) VALUES (?, ?, ?)",
+                (image, self.owner, now + self.lease_seconds)
+            )
+            self.conn.execute(
+                "DELETE FROM leases WHERE owner = ? AND image != ?",
+                (self.owner, image)
+            )
+            self.conn.execute("COMMIT")
+            return True
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def lease_next(self, candidates, labeled):
+        """Lease the first candidate that is neither labeled nor leased elsewhere"""
+        # Snapshot of other instances' leases lets us skip most candidates without locking
+        blocked = {
+            row[0] for row in self.conn.execute(
+                "SELECT image FROM leases WHERE owner != ? AND expires > ?",
+                (self.owner, time.time())
+            )
+        }
+        for image in candidates:
+            if image in blocked or annotation_stem(image) in labeled:
+                continue
+            if self.acquire(image):
+                return image
+        return None
+
+    def renew(self):
+        """Extend every lease held by this instance"""
+        self.conn.execute(
+            "UPDATE leases SET expires = ? WHERE owner = ?",
+            (time.time() + self.lease_seconds, self.owner)
+        )
+
+    def release(self):
+        """Drop every lease held by this instance"""
+        self.conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+
+    def close(self):
+        self.release()
+        self.conn.close()
+
+def write_json_atomic(path, data):
+    """Write JSON through a temporary file so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def write_yolo_annotations(labeled_path, filename, annotations_data, labels):
+    """Write the YOLO .txt and readable .json annotation files for one image"""
+    img_width, img_height = annotations_data['image_size']
+    
+    # YOLO format (class_id center_x center_y width height - normalized)
+    lines = []
+    for annotation in annotations_data['annotations']:
+        label = annotation['label']
+        class_id = labels.index(label) if label in labels else 0
+        
+        x1, y1, x2, y2 = annotation['bbox']
+        
+        # Convert to YOLO format (normalized center coordinates and dimensions)
+        center_x = (x1 + x2) / 2 / img_width
+        center_y = (y1 + y2) / 2 / img_height
+        width = (x2 - x1) / img_width
+        height = (y2 - y1) / img_height
+        
+        lines.append(f"{class_id} {center_x:.6f} {center_y:.6f} {width:.6f} {height:.6f}\n")
+    
+    txt_path = os.path.join(labeled_path, f"{filename}.txt")
+    tmp_path = f"{txt_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, txt_path)
+    
+    write_json_atomic(os.path.join(labeled_path, f"{filename}.json"), annotations_data)
+
+def write_classes_file(labeled_path, labels):
+    """Write classes.txt with one label per line"""
+    labels_path = os.path.join(labeled_path, "classes.txt")
+    with open(labels_path, 'w') as f:
+        for label in labels:
+            f.write(f"{label}\n")
+
+def read_image_size(image_path):
+    """Return [width, height] from the image header without decoding pixels"""
+    with Image.open(image_path) as img:
+        return list(img.size)
+
+def read_classes_file(labeled_path):
+    """Read classes.txt, returning an empty list if it does not exist"""
+    labels_path = os.path.join(labeled_path, "classes.txt")
+    if not os.path.exists(labels_path):
+        return []
+    with open(labels_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+class AnnotationIndex:
+    """In-memory index of the per-image JSON annotations in Labeled_Data
+
+    The labeler updates the index on every save, and ``refresh`` picks up
+    files written by other labeler instances by comparing modification times.
+    Every change bumps ``version``, which the API server uses for ETags.
+    """
+
+    def __init__(self, labeled_path, labels, lease_db=None):
+        self.labeled_path = labeled_path
+        self.labels = labels  # Shared with the labeler so new classes show up in both; guarded by lock
+        self.lease_db = lease_db  # Work queue whose leases block API writes
+        self.records = {}
+        self.mtimes = {}
+        self.revisions = {}
+        self.version = 0
+        self.last_refresh = 0.0
+        self.lock = threading.Lock()
+        self._names = None
+        self._snapshot = None
+    
+    def refresh(self):
+        """Reload records whose JSON file changed on disk since the last scan"""
+        seen = set()
+        changed = {}
+        for entry in os.scandir(self.labeled_path):
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            name = entry.name[:-len('.json')]
+            seen.add(name)
+            mtime = entry.stat().st_mtime_ns
+            if self.mtimes.get(name) == mtime:
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    changed[name] = (json.load(f), mtime)
+            except (OSError, ValueError):
+                # Written non-atomically by an older labeler; pick it up next scan
+                continue
+        
+        with self.lock:
+            self.last_refresh = time.time()
+            removed = [
+                name for name in self.records
+                if name not in seen and not os.path.exists(os.path.join(self.labeled_path, f"{name}.json"))
+            ]
+            if not changed and not removed:
+                return
+            
+            self.version += 1
+            for name in removed:
+                del self.records[name]
+                del self.mtimes[name]
+                del self.revisions[name]
+            for name, (record, mtime) in changed.items():
+                self.records[name] = record
+                self.mtimes[name] = mtime
+                self.revisions[name] = self.version
+            self._names = None
+    
+    def update(self, name, record):
+        """Record a freshly written annotation file"""
+        json_path = os.path.join(self.labeled_path, f"{name}.json")
+        mtime = os.stat(json_path).st_mtime_ns if os.path.exists(json_path) else None
+        with self.lock:
+            self.version += 1
+            if name not in self.records:
+                self._names = None
+            self.records[name] = record
+            self.mtimes[name] = mtime
+            self.revisions[name] = self.version
+    
+    def get(self, name):
+        """Return (revision, record) for one image, or None"""
+        with self.lock:
+            if name not in self.records:
+                return None
+            return self.revisions[name], self.records[name]
+    
+    def page(self, offset, limit):
+        """Return (total, items) for a slice of the records sorted by name"""
+        with self.lock:
+            if self._names is None:
+                self._names = sorted(self.records)
+            names = self._names[offset:offset + limit]
+            items = [dict(self.records[name], name=name) for name in names]
+            return len(self._names), items
+    
+    def snapshot_body(self):
+        """Return the encoded dataset snapshot, cached until the next change"""
+        with self.lock:
+            if self._snapshot is None or self._snapshot[0] != self.version:
+                body = json.dumps({
+                    "version": self.version,
+                    "classes": list(self.labels),
+                    "images": self.records
+                }).encode('utf-8')
+                self._snapshot = (self.version, body)
+            return self._snapshot[1]
+    
+    def ingest(self, records):
+        """Validate and write a batch of annotation records, returning the count written"""
+        prepared = []
+        with self.lock:
+            for record in records:
+                image_path = record.get('image_path') or record.get('name')
+                if not image_path:
+                    raise ValueError("Each record needs an 'image_path' or 'name'")
+                name = record.get('name') or os.path.splitext(os.path.basename(image_path))[0]
+                if os.path.basename(name) != name or name.startswith('.'):
+                    raise ValueError(f"Invalid record name: {name}")
+                
+                img_width, img_height = (int(v) for v in record['image_size'])
+                if img_width <= 0 or img_height <= 0:
+                    raise ValueError(f"Invalid image_size for {name}: {record['image_size']}")
+                annotations = []
+                for annotation in record.get('annotations', []):
+                    x1, y1, x2, y2 = (float(v) for v in annotation['bbox'])
+                    if not (0 <= x1 < x2 <= img_width and 0 <= y1 < y2 <= img_height):
+                        raise ValueError(f"Invalid bbox for {name}: {annotation['bbox']}")
+                    annotations.append({'label': str(annotation['label']), 'bbox': [x1, y1, x2, y2]})
+                
+                prepared.append((name, image_path, [int(img_width), int(img_height)], annotations))
+            
+            # Never overwrite an image another labeler is working on
+            if self.lease_db:
+                queue = WorkQueue(self.lease_db, "annotation-api")
+                try:
+                    leased = {annotation_stem(image): owner for image, owner in queue.leases().items()}
+                finally:
+                    queue.conn.close()
+                for name, _, _, _ in prepared:
+                    if name in leased:
+                        raise LeaseConflictError(f"{name} is being labeled by {leased[name]}")
+            
+            # Only register new labels once the whole batch is valid
+            for _, _, _, annotations in prepared:
+                for annotation in annotations:
+                    if annotation['label'] not in self.labels:
+                        self.labels.append(annotation['label'])
+            labels = list(self.labels)
+        
+        prepared = [
+            (name, {
+                'image_path': image_path,
+                'image_size': image_size,
+                'labels': labels,
+                'annotations': annotations
+            })
+            for name, image_path, image_size, annotations in prepared
+        ]
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(
+                lambda item: write_yolo_annotations(self.labeled_path, item[0], item[1], labels),
+                prepared
+            ))
+        write_classes_file(self.labeled_path, labels)
+        
+        for name, annotations_data in prepared:
+            self.update(name, annotations_data)
+        return len(prepared)
+
+class AnnotationServer:
+    """Small asyncio HTTP/1.1 server exposing an AnnotationIndex as JSON
+
+    Endpoints:
+        GET  /classes                          class names
+        GET  /annotations?offset=0&limit=100   paginated annotation records
+        GET  /annotations/<name>               one image's annotations
+        GET  /snapshot                         classes and every record at once
+        POST /annotations                      bulk ingest a JSON list of records
+
+    GET responses carry an ETag and honour If-None-Match with 304 Not Modified.
+    """
+
+    max_page_size = 1000
+    refresh_interval = 2.0
+
+    def __init__(self, index, host="127.0.0.1", port=8765):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.thread = None
+        self.error = None
+        self.ready = threading.Event()
+    
+    def start(self):
+        """Run the server on a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error:
+            raise self.error
+    
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+    
+    def serve_forever(self):
+        """Run the server on the current thread until stopped"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_client, self.host, self.port)
+            )
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            server.close()
+            self.loop.run_until_complete(server.wait_closed())
+            self.loop.close()
+    
+    async def handle_client(self, reader, writer):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                
+                body = b''
+                length = int(headers.get('content-length', 0))
+                if length:
+                    body = await reader.readexactly(length)
+                
+                try:
+                    status, payload, etag = await self.dispatch(method, target, body, headers)
+                except LeaseConflictError as e:
+                    status, payload, etag = 409, {"error": str(e)}, None
+                except (ValueError, KeyError, TypeError) as e:
+                    status, payload, etag = 400, {"error": str(e)}, None
+                except Exception as e:
+                    status, payload, etag = 500, {"error": f"Internal error: {e}"}, None
+                
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.send_response(writer, status, payload, etag, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    async def dispatch(self, method, target, body, headers):
+        """Route a request, returning (status, payload, etag)"""
+        loop = asyncio.get_event_loop()
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        query = parse_qs(url.query)
+        if_none_match = headers.get('if-none-match', '')
+        
+        def not_modified(etag):
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match == '*'
+        
+        if method == 'GET':
+            # Pick up annotations saved by other labeler instances
+            if time.time() - self.index.last_refresh > self.refresh_interval:
+                await loop.run_in_executor(None, self.index.refresh)
+            
+            if path == '/classes':
+                classes = list(self.index.labels)
+                etag = '"c-%s"' % hashlib.sha1(json.dumps(classes).encode('utf-8')).hexdigest()
+                if not_modified(etag):
+                    return 304, None, etag
+                return 200, {"classes": classes}, etag
+            
+            if path == '/annotations':
+                offset = max(int(query.get('offset', ['0'])[0]), 0)
+                limit = min(max(int(query.get('limit', ['100'])[0]), 1), self.max_page_size)
+                etag = f'"a-{self.index.version}-{offset}-{limit}"'
+                if not_modified(etag):
+                    return 304, None, etag
+                total, items = self.index.page(offset, limit)
+                return 200, {"total": total, "offset": offset, "limit": limit, "items": items}, etag
+            
+            if path.startswith('/annotations/'):
+                name = unquote(path[len('/annotations/'):])
+                entry = self.index.get(name)
+                if entry is None:
+                    return 404, {"error": f"No annotations for {name}"}, None
+                revision, record = entry
+                etag = f'"r-{revision}"'
+                if not_modified(etag):
+                    return 304, None, etag
+                return 200, record, etag
+            
+            if path == '/snapshot':
+                etag = f'"s-{self.index.version}"'
+                if not_modified(etag):
+                    return 304, None, etag
+                return 200, await loop.run_in_executor(None, self.index.snapshot_body), etag
+            
+            return 404, {"error": f"Unknown path: {path}"}, None
+        
+        if method == 'POST' and path == '/annotations':
+            records = json.loads(body.decode('utf-8'))
+            if isinstance(records, dict):
+                records = records.get('records', [])
+            count = await loop.run_in_executor(None, self.index.ingest, records)
+            return 200, {"ingested": count, "version": self.index.version}, None
+        
+        return 405, {"error": f"Method not allowed: {method} {path}"}, None
+    
+    async def send_response(self, writer, status, payload, etag, keep_alive):
+        if payload is None:
+            body = b''
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload).encode('utf-8')
+        
+        lines = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if etag:
+            lines.append(f"ETag: {etag}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+def process_pool():
+    """Return a process pool whose workers start fresh instead of forking this process
+
+    Forking copies the Tk interpreter and the locks held by the catalog, API
+    and export threads at that moment, which can deadlock the workers.
+    """
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+
+def bounded_map(executor, fn, items, window, on_error=None):
+    """Like executor.map, but submits lazily and keeps at most window tasks in flight
+
+    With on_error, a task that raises yields on_error(item, exception) in its
+    place instead of ending the iteration.
+    """
+    pending = deque()
+    
+    def next_result():
+        item, future = pending.popleft()
+        if on_error is None:
+            return future.result()
+        try:
+            return future.result()
+        except Exception as e:
+            return on_error(item, e)
+    
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            yield next_result()
+    while pending:
+        yield next_result()
+
+class JsonStream:
+    """Incremental reader over a JSON text file, decoding one value at a time"""
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+    
+    def fill(self):
+        # Drop consumed text so the buffer only ever holds about one element
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf += chunk
+        return bool(chunk)
+    
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+    
+    def take(self, expected):
+        found = self.peek()
+        if found != expected:
+            raise ValueError(f"Malformed JSON: expected {expected!r}, found {found!r}")
+        self.pos += 1
+    
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be a truncated number
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+def iter_json_array_items(path, keys):
+    """Yield (key, item) for every element of the named top-level arrays in a JSON file
+
+    Memory use is bounded by the largest single element rather than the file size.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f)
+        stream.take('{')
+        if stream.peek() == '}':
+            return
+        
+        while True:
+            key = stream.value()
+            stream.take(':')
+            if key in keys and stream.peek() == '[':
+                stream.take('[')
+                if stream.peek() == ']':
+                    stream.take(']')
+                else:
+                    while True:
+                        yield key, stream.value()
+                        if stream.peek() == ']':
+                            stream.take(']')
+                            break
+                        stream.take(',')
+            else:
+                stream.value()
+            
+            if stream.peek() == '}':
+                break
+            stream.take(',')
+
+def parse_voc_file(xml_path):
+    """Parse one Pascal VOC XML file into (filename, (width, height), [(label, bbox)])"""
+    filename = None
+    size = [0, 0]
+    objects = []
+    for _, elem in ET.iterparse(xml_path, events=('end',)):
+        if elem.tag == 'filename':
+            filename = (elem.text or '').strip()
+        elif elem.tag == 'size':
+            size = [int(float(elem.findtext('width', '0'))), int(float(elem.findtext('height', '0')))]
+            elem.clear()
+        elif elem.tag == 'object':
+            bndbox = elem.find('bndbox')
+            if bndbox is not None:
+                bbox = [float(bndbox.findtext(tag, '0')) for tag in ('xmin', 'ymin', 'xmax', 'ymax')]
+                objects.append(((elem.findtext('name') or '').strip(), bbox))
+            elem.clear()
+    
+    if not filename:
+        filename = os.path.splitext(os.path.basename(xml_path))[0] + '.jpg'
+    return filename, size, objects
+
+def serve_annotations(labeled_path, port, host="127.0.0.1"):
+    """Run the annotation API without the GUI, e.g. beside a running labeler"""
+    index = AnnotationIndex(labeled_path, read_classes_file(labeled_path),
+                            os.path.join(labeled_path, "work_queue.sqlite3"))
+    index.refresh()
+    server = AnnotationServer(index, host, port)
+    print(f"Serving annotations from {labeled_path} on http://{host}:{port}")
+    server.serve_forever()
+    if server.error:
+        raise server.error
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.gif'}
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+MULTI_FRAME_EXTENSIONS = {'.tif', '.tiff', '.gif'}
+
+FORMAT_BY_EXTENSION = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.bmp': 'BMP',
+                       '.tif': 'TIFF', '.tiff': 'TIFF', '.gif': 'GIF'}
+
+# Images inside archives and frames of multi-frame files are addressed by
+# appending "::<member path>" and/or "::frame<N>" to the file path, e.g.
+# "Unlabeled_Data/batch1.zip::images/0001.jpg" or "Unlabeled_Data/scan.tif::frame2"
+KEY_SEPARATOR = '::'
+
+# Joins the parts of archive member and frame stems; it is doubled inside
+# plain file names, so a loose file can never take a derived stem
+STEM_SEPARATOR = '~'
+
+def split_image_key(image_path):
+    """Split an image path or key into (file path, archive member or None, frame or None)"""
+    parts = image_path.split(KEY_SEPARATOR)
+    frame = None
+    if len(parts) > 1 and parts[-1].startswith('frame') and parts[-1][len('frame'):].isdigit():
+        frame = int(parts.pop()[len('frame'):])
+    member = KEY_SEPARATOR.join(parts[1:]) or None
+    return parts[0], member, frame
+
+def image_key(image_path):
+    """Return the key of an image path relative to its folder"""
+    path, sep, rest = image_path.partition(KEY_SEPARATOR)
+    return os.path.basename(path) + sep + rest
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def annotation_stem(key):
+    """Return the file name stem used for an image key's annotation files
+
+    Loose files use their name without the extension. Archive members and
+    frames join the full archive, member and frame names with STEM_SEPARATOR,
+    e.g. ``batch1.zip~images~0001.jpg`` or ``scan.tif~frame2``.
+    """
+    path, member, frame = split_image_key(key)
+    escape = lambda part: part.replace(STEM_SEPARATOR, STEM_SEPARATOR * 2)
+    if member is None and frame is None:
+        return escape(os.path.splitext(os.path.basename(path))[0])
+    parts = [os.path.basename(path)]
+    if member is not None:
+        parts.extend(member.split('/'))
+    if frame is not None:
+        parts.append(f"frame{frame}")
+    return STEM_SEPARATOR.join(escape(part) for part in parts)
+
+def export_image_name(key):
+    """Return the file name an image key is written under in an exported dataset"""
+    path, member, frame = split_image_key(key)
+    if frame is not None:
+        return annotation_stem(key) + '.png'  # Single frames are re-encoded losslessly
+    if member is None:
+        return os.path.basename(path)
+    return annotation_stem(key)  # Ends in the member's own extension
+
+class ImageArchive:
+    """Shared read-only handle on a zip or tar archive with an index of its image members"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        self.lock = threading.Lock()
+        self.zip = None
+        self.tar = None
+        if zipfile.is_zipfile(path):
+            self.zip = zipfile.ZipFile(path)
+            self.members = {
+                info.filename: info for info in self.zip.infolist()
+                if not info.is_dir() and os.path.splitext(info.filename.lower())[1] in IMAGE_EXTENSIONS
+            }
+        else:
+            # Random access into a compressed tar re-reads it from the start for every
+            # member, so only uncompressed tars are accepted
+            try:
+                self.tar = tarfile.open(path, 'r:')
+            except tarfile.ReadError:
+                raise tarfile.TarError("compressed tar archives are not supported, repack as .tar or .zip")
+            self.members = {
+                info.name: info for info in self.tar.getmembers()
+                if info.isfile() and os.path.splitext(info.name.lower())[1] in IMAGE_EXTENSIONS
+            }
+    
+    def names(self):
+        return sorted(self.members)
+    
+    def _open_member(self, member):
+        if self.zip:
+            return self.zip.open(self.members[member])
+        return self.tar.extractfile(self.members[member])
+    
+    def read(self, member):
+        """Return a member's bytes as a seekable file object"""
+        with self.lock:
+            with self._open_member(member) as f:
+                return io.BytesIO(f.read())
+    
+    def copy_member(self, member, dest_path):
+        """Stream a member straight into dest_path without extracting the archive"""
+        with self.lock:
+            with self._open_member(member) as src, open(dest_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+    
+    def close(self):
+        if self.zip:
+            self.zip.close()
+        if self.tar:
+            self.tar.close()
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def get_archive(path):
+    """Return the shared ImageArchive for path, reopening it if the file changed"""
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None or archive.mtime_ns != os.stat(path).st_mtime_ns:
+            if archive:
+                archive.close()
+            archive = ImageArchive(path)
+            _archives[path] = archive
+        return archive
+
+def open_image(image_path):
+    """Open an image file, archive member or frame lazily, without extracting anything"""
+    path, member, frame = split_image_key(image_path)
+    if member is None:
+        img = Image.open(path)
+    else:
+        img = Image.open(get_archive(path).read(member))
+    if frame is not None:
+        img.seek(frame)
+    return img
+
+# Modes a single frame can be written to PNG in unchanged
+PNG_MODES = {'1', 'L', 'LA', 'I;16', 'I;16B', 'P', 'RGB', 'RGBA'}
+
+def copy_image(image_path, dest_path):
+    """Copy an image file, archive member or frame to dest_path"""
+    path, member, frame = split_image_key(image_path)
+    if frame is not None:
+        with open_image(image_path) as img:
+            if img.mode in ('I', 'F'):
+                img = img.convert('I;16')
+            elif img.mode not in PNG_MODES:
+                img = img.convert('RGBA' if 'A' in img.getbands() or 'a' in img.getbands() else 'RGB')
+            img.save(dest_path, 'PNG')
+    elif member is not None:
+        get_archive(path).copy_member(member, dest_path)
+    else:
+        shutil.copy2(path, dest_path)
+
+def _window_sums(values, shape):
+    """Sum of values over every window of the given shape, via an integral image"""
+    height, width = shape
+    integral = np.pad(values, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+def match_template(search, template):
+    """Return (row, col, score) of the best normalized cross-correlation match of template in search"""
+    template = template - template.mean()
+    template_norm = np.sqrt((template * template).sum())
+    if template_norm < 1e-6:
+        return None  # Flat template, nothing to track
+    
+    # Correlating against the zero-mean template makes the window mean drop out of the numerator
+    windows = np.lib.stride_tricks.sliding_window_view(search, template.shape)
+    numerator = np.einsum('ijkl,kl->ij', windows, template)
+    
+    n = template.size
+    sums = _window_sums(search, template.shape)
+    square_sums = _window_sums(search * search, template.shape)
+    window_norm = np.sqrt(np.maximum(square_sums - sums * sums / n, 1e-6))
+    scores = numerator / (window_norm * template_norm)
+    
+    row, col = np.unravel_index(np.argmax(scores), scores.shape)
+    return row, col, float(scores[row, col])
+
+# Tracked boxes matching with a lower correlation score stay where they were
+TRACKING_MIN_SCORE = 0.5
+
+def propagate_boxes(prev_image, next_image, boxes, template_size=32, search_margin=0.5,
+                    min_score=TRACKING_MIN_SCORE):
+    """Carry [x1, y1, x2, y2] boxes from prev_image to their best match in next_image
+
+    Each box is matched with normalized cross-correlation between a grayscale
+    crop of the previous frame, downscaled so its longer side is at most
+    template_size, and a search window around the same spot in the next frame,
+    expanded by search_margin times the box size. Returns (bbox, score) pairs.
+    Boxes always keep their original size; they stay in place when there is
+    nothing to track or the best match scores below min_score.
+    """
+    prev_gray = prev_image.convert('L')
+    next_gray = next_image.convert('L')
+    prev_width, prev_height = prev_gray.size
+    img_width, img_height = next_gray.size
+    results = []
+    
+    for box in boxes:
+        # Boxes may have been drawn past the image edge on the canvas
+        x1, y1 = max(0, min(box[0], prev_width)), max(0, min(box[1], prev_height))
+        x2, y2 = max(0, min(box[2], prev_width)), max(0, min(box[3], prev_height))
+        box_width, box_height = x2 - x1, y2 - y1
+        if box_width < 1 or box_height < 1:
+            results.append((list(box), 0.0))
+            continue
+        scale = min(1.0, template_size / max(box_width, box_height, 1))
+        margin = max(search_margin * max(box_width, box_height), 8)
+        
+        # Search window around the previous position, clipped to the next frame
+        sx1, sy1 = max(0, int(x1 - margin)), max(0, int(y1 - margin))
+        sx2, sy2 = min(img_width, int(x2 + margin)), min(img_height, int(y2 + margin))
+        if sx2 - sx1 < 1 or sy2 - sy1 < 1:
+            results.append((list(box), 0.0))  # Box lies outside a smaller next frame
+            continue
+        
+        template_shape = (max(1, round(box_width * scale)), max(1, round(box_height * scale)))
+        search_shape = (max(1, round((sx2 - sx1) * scale)), max(1, round((sy2 - sy1) * scale)))
+        template = np.asarray(prev_gray.resize(template_shape, Image.Resampling.BILINEAR, box=(x1, y1, x2, y2)), dtype=np.float64)
+        search = np.asarray(next_gray.resize(search_shape, Image.Resampling.BILINEAR, box=(sx1, sy1, sx2, sy2)), dtype=np.float64)
+        
+        match = None
+        if search.shape[0] >= template.shape[0] and search.shape[1] >= template.shape[1]:
+            match = match_template(search, template)
+        if match is None:
+            results.append((list(box), 0.0))
+            continue
+        row, col, score = match
+        if score < min_score:
+            results.append((list(box), score))
+            continue
+        
+        # Map the match back through the search window's actual resize factors
+        new_x1 = sx1 + float(col) * (sx2 - sx1) / search_shape[0]
+        new_y1 = sy1 + float(row) * (sy2 - sy1) / search_shape[1]
+        new_x1 = max(min(new_x1, img_width - box_width), 0)
+        new_y1 = max(min(new_y1, img_height - box_height), 0)
+        
+        # Only the part inside the frame was matched; the whole box moves with it
+        dx, dy = new_x1 - x1, new_y1 - y1
+        results.append(([box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy], score))
+    
+    return results
+
+def write_annotation_table(base_path, table):
+    """Write a box-per-row annotation table, returning the path written
+
+    table holds int32 NumPy columns 'image' and 'split' (codes into the
+    string lists 'image_names' and 'split_names') plus int32 class_id,
+    image_width and image_height and float32 x1, y1, x2, y2. Written as
+    Parquet when pyarrow is installed, otherwise as uncompressed NumPy .npz.
+    """
+    if pa is not None:
+        columns = {}
+        for name, values in table.items():
+            if name.endswith('_names'):
+                continue
+            if f"{name}_names" in table:
+                columns[name] = pa.DictionaryArray.from_arrays(
+                    pa.array(values, pa.int32()), pa.array(list(table[f"{name}_names"]), pa.string())
+                )
+            else:
+                columns[name] = pa.array(values)
+        
+        # One row group with an unlimited dictionary page keeps a single dictionary per
+        # string column, so readers get its codes back without re-encoding any strings.
+        # LZ4 decodes several times faster than zstd for a slightly larger file.
+        arrow_table = pa.table(columns)
+        path = f"{base_path}.parquet"
+        pq.write_table(arrow_table, path, compression='lz4',
+                       use_dictionary=[name for name in columns if f"{name}_names" in table],
+                       dictionary_pagesize_limit=1 << 30, row_group_size=max(1, arrow_table.num_rows))
+        return path
+    
+    # Compressing the float columns costs far more time than it saves space
+    path = f"{base_path}.npz"
+    np.savez(path, **{name: np.asarray(values, dtype=str) if name.endswith('_names') else values
+                      for name, values in table.items()})
+    return path
+
+def load_annotation_table(path):
+    """Load a table written by write_annotation_table into a dict of NumPy columns"""
+    if path.endswith('.parquet'):
+        # ParquetFile.read returns one chunk per row group (read_table splits columns
+        # into batches), so numeric columns convert to NumPy without a copy
+        schema = pq.read_schema(path)
+        string_columns = [field.name for field in schema if pa.types.is_string(field.type)
+                          or pa.types.is_dictionary(field.type)]
+        table = pq.ParquetFile(path, memory_map=True, read_dictionary=string_columns).read()
+        columns = {}
+        for name in table.column_names:
+            column = table.column(name)
+            if pa.types.is_dictionary(column.type):
+                # Chunks share the file's dictionary, so combining them only concatenates codes
+                encoded = column.combine_chunks() if column.num_chunks else pa.array([], column.type)
+                columns[name] = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int32, copy=False)
+                columns[f"{name}_names"] = encoded.dictionary.to_numpy(zero_copy_only=False).astype(str)
+            else:
+                columns[name] = column.to_numpy()
+        return columns
+    
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+# Label cache layout read by Ultralytics YOLO trainers
+YOLO_CACHE_VERSION = "1.0.3"
+
+def yolo_label_rows(annotations, img_width, img_height, class_ids):
+    """Convert xyxy pixel boxes to (classes, normalized xywh boxes) clipped to the image"""
+    classes = []
+    boxes = []
+    for annotation in annotations:
+        x1, y1, x2, y2 = annotation['bbox']
+        x1, x2 = min(max(x1, 0), img_width), min(max(x2, 0), img_width)
+        y1, y2 = min(max(y1, 0), img_height), min(max(y2, 0), img_height)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        classes.append(class_ids.get(annotation['label'], 0))
+        boxes.append([
+            (x1 + x2) / 2 / img_width,
+            (y1 + y2) / 2 / img_height,
+            (x2 - x1) / img_width,
+            (y2 - y1) / img_height
+        ])
+    return classes, boxes
+
+def read_exif_orientation(image_path):
+    """Return the EXIF orientation (1-8) of an image from its header only"""
+    with Image.open(image_path) as img:
+        try:
+            return int(img.getexif().get(0x0112, 1))
+        except Exception:
+            return 1
+
+def write_yolo_label_cache(cache_path, entries):
+    """Write a prebuilt YOLO label cache so trainers skip label verification
+
+    entries is a list of (image_path, label_path, (height, width), classes, boxes)
+    sorted by image path. The hash covers file sizes and paths, matching the
+    check trainers use to decide whether the cache is still valid.
+    """
+    image_files = [entry[0] for entry in entries]
+    label_files = [entry[1] for entry in entries]
+    paths = label_files + image_files
+    digest = hashlib.sha256(str(sum(os.path.getsize(p) for p in paths if os.path.exists(p))).encode())
+    digest.update("".join(paths).encode())
+    
+    labels = []
+    for image_path, _, shape, classes, boxes in entries:
+        labels.append({
+            'im_file': image_path,
+            'shape': shape,
+            'cls': np.array(classes, dtype=np.float32).reshape(-1, 1),
+            'bboxes': np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            'segments': [],
+            'keypoints': None,
+            'normalized': True,
+            'bbox_format': 'xywh'
+        })
+    
+    found = sum(1 for entry in entries if entry[3])
+    cache = {
+        'labels': labels,
+        'hash': digest.hexdigest(),
+        'results': (found, 0, len(entries) - found, 0, len(entries)),
+        'msgs': [],
+        'version': YOLO_CACHE_VERSION
+    }
+    with open(cache_path, 'wb') as f:
+        np.save(f, cache, allow_pickle=True)
+
+def coco_annotation_data(image_file, img_width, img_height, annotations, labels):
+    """Build the single-image COCO annotation record"""
+    coco_data = {
+        "images": [{
+            "id": 1,
+            "width": img_width,
+            "height": img_height,
+            "file_name": image_file
+        }],
+        "annotations": [],
+        "categories": []
+    }
+    
+    # Add categories
+    for i, label in enumerate(labels):
+        coco_data["categories"].append({
+            "id": i + 1,  # COCO categories start from 1
+            "name": label,
+            "supercategory": "object"
+        })
+    
+    # Add annotations
+    for ann_id, annotation in enumerate(annotations):
+        x1, y1, x2, y2 = annotation['bbox']
+        width = x2 - x1
+        height = y2 - y1
+        area = width * height
+        
+        label = annotation['label']
+        category_id = labels.index(label) + 1 if label in labels else 1
+        
+        coco_data["annotations"].append({
+            "id": ann_id + 1,
+            "image_id": 1,
+            "category_id": category_id,
+            "bbox": [x1, y1, width, height],  # COCO format: [x, y, width, height]
+            "area": area,
+            "iscrowd": 0
+        })
+    return coco_data
+
+def voc_annotation_tree(image_file, image_path, img_width, img_height, channels, annotations):
+    """Build the Pascal VOC XML tree for one image"""
+    annotation = ET.Element("annotation")
+    
+    # Add folder
+    folder = ET.SubElement(annotation, "folder")
+    folder.text = "images"
+    
+    # Add filename
+    filename_elem = ET.SubElement(annotation, "filename")
+    filename_elem.text = image_file
+    
+    # Add path
+    path = ET.SubElement(annotation, "path")
+    path.text = image_path
+    
+    # Add source
+    source = ET.SubElement(annotation, "source")
+    database = ET.SubElement(source, "database")
+    database.text = "Unknown"
+    
+    # Add size
+    size = ET.SubElement(annotation, "size")
+    width = ET.SubElement(size, "width")
+    width.text = str(img_width)
+    height = ET.SubElement(size, "height")
+    height.text = str(img_height)
+    depth = ET.SubElement(size, "depth")
+    depth.text = str(channels)
+    
+    # Add segmented
+    segmented = ET.SubElement(annotation, "segmented")
+    segmented.text = "0"
+    
+    # Add objects
+    for rect_annotation in annotations:
+        obj = ET.SubElement(annotation, "object")
+        
+        name = ET.SubElement(obj, "name")
+        name.text = rect_annotation['label']
+        
+        pose = ET.SubElement(obj, "pose")
+        pose.text = "Unspecified"
+        
+        truncated = ET.SubElement(obj, "truncated")
+        truncated.text = "0"
+        
+        difficult = ET.SubElement(obj, "difficult")
+        difficult.text = "0"
+        
+        bndbox = ET.SubElement(obj, "bndbox")
+        x1, y1, x2, y2 = rect_annotation['bbox']
+        
+        xmin = ET.SubElement(bndbox, "xmin")
+        xmin.text = str(int(x1))
+        ymin = ET.SubElement(bndbox, "ymin")
+        ymin.text = str(int(y1))
+        xmax = ET.SubElement(bndbox, "xmax")
+        xmax.text = str(int(x2))
+        ymax = ET.SubElement(bndbox, "ymax")
+        ymax.text = str(int(y2))
+    return ET.ElementTree(annotation)
+
+def pytorch_annotation_data(image_file, img_width, img_height, channels, annotations, labels):
+    """Build the custom PyTorch annotation record for one image"""
+    pytorch_data = {
+        "image_info": {
+            "filename": image_file,
+            "width": img_width,
+            "height": img_height,
+            "channels": channels
+        },
+        "annotations": [],
+        "classes": {label: i for i, label in enumerate(labels)}
+    }
+    
+    for annotation in annotations:
+        x1, y1, x2, y2 = annotation['bbox']
+        label = annotation['label']
+        class_id = labels.index(label) if label in labels else 0
+        
+        pytorch_data["annotations"].append({
+            "class_id": class_id,
+            "class_name": label,
+            "bbox": [x1, y1, x2, y2],  # [x1, y1, x2, y2] format
+            "bbox_mode": "xyxy"
+        })
+    return pytorch_data
+
+def file_sha1(path):
+    """Hash a file's bytes in chunks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(src, dst):
+    """Hard-link src to dst, copying when links are not supported"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+# Offline detection augmentation applied by the export augmentation stage
+DEFAULT_AUGMENT_RECIPE = {
+    'flip': 0.5,                  # probability of a horizontal flip
+    'scale': [0.5, 1.5],          # random resize factor range
+    'crop': 0.5,                  # probability of a random crop
+    'crop_fraction': [0.6, 1.0],  # crop side as a fraction of the resized image
+    'mosaic': 0.3,                # probability of a 2x2 mosaic with three other images
+    'mosaic_size': 640,           # side of the square mosaic canvas
+    'min_visibility': 0.2,        # drop boxes keeping less than this fraction of their area
+    'format': 'JPEG',             # Pillow format, extension and quality of the rendered variants
+    'extension': '.jpg',
+    'quality': 95
+}
+
+def clip_boxes(boxes, labels, x0, y0, x1, y1, min_visibility):
+    """Clip boxes to a window and shift them into its coordinates, dropping mostly-hidden boxes"""
+    kept_boxes = []
+    kept_labels = []
+    for (bx1, by1, bx2, by2), label in zip(boxes, labels):
+        cx1, cy1 = max(bx1, x0), max(by1, y0)
+        cx2, cy2 = min(bx2, x1), min(by2, y1)
+        if cx2 - cx1 < 2 or cy2 - cy1 < 2:
+            continue
+        area = (bx2 - bx1) * (by2 - by1)
+        if area > 0 and (cx2 - cx1) * (cy2 - cy1) / area < min_visibility:
+            continue
+        kept_boxes.append([cx1 - x0, cy1 - y0, cx2 - x0, cy2 - y0])
+        kept_labels.append(label)
+    return kept_boxes, kept_labels
+
+def scale_to_8bit(img):
+    """Map 16-bit grayscale samples to 8-bit 'L'; a plain conversion clips them to white"""
+    if img.mode == 'I' or img.mode.startswith('I;16'):
+        return img.convert('I').point(lambda value: value / 256).convert('L')
+    return img
+
+def _load_rgb(image_path):
+    with Image.open(image_path) as img:
+        return scale_to_8bit(img).convert('RGB')
+
+def _mosaic(sources, recipe, rng):
+    """Tile four images around a random centre point on a square canvas"""
+    size = recipe['mosaic_size']
+    canvas = Image.new('RGB', (size, size), (114, 114, 114))
+    cx = int(rng.uniform(0.25, 0.75) * size)
+    cy = int(rng.uniform(0.25, 0.75) * size)
+    quadrants = [(0, 0, cx, cy), (cx, 0, size, cy), (0, cy, cx, size), (cx, cy, size, size)]
+    
+    boxes = []
+    labels = []
+    for index, ((image_path, src_boxes, src_labels), (qx0, qy0, qx1, qy1)) in enumerate(zip(sources, quadrants)):
+        quad_width, quad_height = qx1 - qx0, qy1 - qy0
+        if quad_width < 1 or quad_height < 1:
+            continue
+        img = _load_rgb(image_path)
+        scale = max(quad_width / img.width, quad_height / img.height)
+        resized = img.resize((max(quad_width, round(img.width * scale)), max(quad_height, round(img.height * scale))),
+                             Image.Resampling.BILINEAR)
+        
+        # Keep the part of each image that touches the mosaic centre
+        ox = resized.width - quad_width if index in (0, 2) else 0
+        oy = resized.height - quad_height if index in (0, 1) else 0
+        canvas.paste(resized.crop((ox, oy, ox + quad_width, oy + quad_height)), (qx0, qy0))
+        
+        scaled = [[v * resized.width / img.width if i % 2 == 0 else v * resized.height / img.height
+                   for i, v in enumerate(box)] for box in src_boxes]
+        kept_boxes, kept_labels = clip_boxes(scaled, src_labels, ox, oy, ox + quad_width, oy + quad_height,
+                                             recipe['min_visibility'])
+        boxes.extend([x1 + qx0, y1 + qy0, x2 + qx0, y2 + qy0] for x1, y1, x2, y2 in kept_boxes)
+        labels.extend(kept_labels)
+    return canvas, boxes, labels
+
+def augment_image(job):
+    """Render one augmented variant (runs in a worker process), returning (size, boxes, labels)
+
+    job is (output_path, sources, recipe, seed) where sources holds one
+    (image_path, boxes, labels) tuple, or four for a mosaic.
+    """
+    output_path, sources, recipe, seed = job
+    rng = random.Random(seed)
+    
+    if len(sources) == 4:
+        img, boxes, labels = _mosaic(sources, recipe, rng)
+    else:
+        image_path, boxes, labels = sources[0]
+        img = _load_rgb(image_path)
+        
+        # Random scale
+        scale = rng.uniform(*recipe['scale'])
+        new_width, new_height = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+        scale_x, scale_y = new_width / img.width, new_height / img.height
+        img = img.resize((new_width, new_height), Image.Resampling.BILINEAR)
+        boxes = [[x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y] for x1, y1, x2, y2 in boxes]
+        
+        # Random crop
+        if rng.random() < recipe['crop']:
+            fraction = rng.uniform(*recipe['crop_fraction'])
+            crop_width, crop_height = max(1, round(new_width * fraction)), max(1, round(new_height * fraction))
+            x0 = rng.randint(0, new_width - crop_width)
+            y0 = rng.randint(0, new_height - crop_height)
+            img = img.crop((x0, y0, x0 + crop_width, y0 + crop_height))
+            boxes, labels = clip_boxes(boxes, labels, x0, y0, x0 + crop_width, y0 + crop_height,
+                                       recipe['min_visibility'])
+    
+    # Random horizontal flip
+    if rng.random() < recipe['flip']:
+        img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        boxes = [[img.width - x2, y1, img.width - x1, y2] for x1, y1, x2, y2 in boxes]
+    
+    img.save(output_path, recipe['format'], quality=recipe['quality'])
+    return list(img.size), boxes, list(labels)
+
+# Export image re-encoding: UI choice -> (Pillow format, file extension)
+TRANSCODE_FORMATS = {'JPEG': ('JPEG', '.jpg'), 'WebP': ('WEBP', '.webp')}
+
+# Transpose that displays an image upright for each EXIF orientation value
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+# EXIF orientation that undoes each orientation (rotations by 90 degrees swap)
+EXIF_INVERSE_ORIENTATION = {2: 2, 3: 3, 4: 4, 5: 5, 6: 8, 7: 7, 8: 6}
+
+def orient_boxes(boxes, orientation, img_width, img_height):
+    """Map xyxy boxes on the stored pixels to the same boxes after applying EXIF orientation"""
+    point_maps = {
+        2: lambda x, y: (img_width - x, y),
+        3: lambda x, y: (img_width - x, img_height - y),
+        4: lambda x, y: (x, img_height - y),
+        5: lambda x, y: (y, x),
+        6: lambda x, y: (img_height - y, x),
+        7: lambda x, y: (img_height - y, img_width - x),
+        8: lambda x, y: (y, img_width - x)
+    }
+    point_map = point_maps.get(orientation)
+    if point_map is None:
+        return [list(box) for box in boxes]
+    oriented = []
+    for x1, y1, x2, y2 in boxes:
+        (ax, ay), (bx, by) = point_map(x1, y1), point_map(x2, y2)
+        oriented.append([min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)])
+    return oriented
+
+def transcode_image(job):
+    """Re-encode one image for export (runs in a worker process)
+
+    job is (source_path, dest_path, image_format, quality, max_side, boxes,
+    remove_source). The image is turned upright from its EXIF orientation,
+    shrunk so its longest side is at most max_side (0 keeps the size) and
+    saved without EXIF/XMP metadata. Returns (source bytes, exported bytes,
+    [width, height], channels, boxes) with the boxes mapped to the new pixels.
+    """
+    source_path, dest_path, image_format, quality, max_side, boxes, remove_source = job
+    source_size = os.path.getsize(source_path)
+    try:
+        with Image.open(source_path) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            icc_profile = img.info.get('icc_profile')
+            has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+            if image_format == 'WEBP' and has_alpha:
+                img = img.convert('RGBA')
+            elif img.mode == 'I' or img.mode.startswith('I;16'):
+                img = scale_to_8bit(img)
+            elif img.mode not in ('L', 'RGB'):
+                img = img.convert('L' if img.mode in ('1', 'L', 'LA') else 'RGB')
+            else:
+                img.load()
+    finally:
+        if remove_source:
+            os.remove(source_path)
+    
+    boxes = orient_boxes(boxes, orientation, img.width, img.height)
+    if orientation in EXIF_TRANSPOSE:
+        img = img.transpose(EXIF_TRANSPOSE[orientation])
+    
+    if max_side and max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        scale_x, scale_y = new_size[0] / img.width, new_size[1] / img.height
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+        boxes = [[x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y] for x1, y1, x2, y2 in boxes]
+    
+    # Only the colour profile survives; EXIF, XMP and comments are dropped
+    img.info = {}
+    img.save(dest_path, image_format, quality=quality, icc_profile=icc_profile)
+    
+    # Channels as decoders see the output (WebP has no grayscale, so L comes back as RGB)
+    with Image.open(dest_path) as exported:
+        channels = MODE_CHANNELS.get(exported.mode, len(exported.getbands()))
+    return source_size, os.path.getsize(dest_path), list(img.size), channels, boxes
+
+# Object crops written per tar shard in the packed crop layout
+CROPS_PER_SHARD = 10000
+
+def crop_folder_name(label):
+    """Make a class label safe to use as a folder name"""
+    return "".join(c if c.isalnum() or c in "-_. " else "_" for c in label).strip() or "_"
+
+def crop_objects(job):
+    """Cut every box out of one image, reading it only once (runs in a worker process)
+
+    job is (source_path, crops, padding, crop_size, image_format, quality,
+    remove_source) where crops holds (bbox, dest_path) pairs. padding grows each
+    box by that fraction of its size per side; a crop_size squares the box first
+    and resizes the crop to crop_size x crop_size. Crops with a dest_path are
+    written there, the others are returned encoded. Returns one
+    ([width, height], data) per box, or None for empty boxes.
+    """
+    source_path, crops, padding, crop_size, image_format, quality, remove_source = job
+    try:
+        with Image.open(source_path) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            full_width, full_height = img.size
+            if crop_size and crops:
+                # When every crop is shrunk at least 2x anyway, let JPEG decode at a reduced scale
+                smallest = min(max(x2 - x1, y2 - y1) for (x1, y1, x2, y2), _ in crops) * (1 + 2 * padding)
+                if smallest >= 2 * crop_size:
+                    reduction = smallest / crop_size
+                    img.draft(None, (full_width / reduction, full_height / reduction))
+            img = scale_to_8bit(img)
+            img = img.convert('L' if img.mode in ('1', 'L') else 'RGB')
+    finally:
+        if remove_source:
+            os.remove(source_path)
+    
+    # Crops are stored upright, like the transcoded exports
+    scale_x, scale_y = img.width / full_width, img.height / full_height
+    boxes = orient_boxes([[x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y] for (x1, y1, x2, y2), _ in crops],
+                         orientation, img.width, img.height)
+    if orientation in EXIF_TRANSPOSE:
+        img = img.transpose(EXIF_TRANSPOSE[orientation])
+    
+    results = []
+    for (x1, y1, x2, y2), (_, dest_path) in zip(boxes, crops):
+        width, height = x2 - x1, y2 - y1
+        if width < 1 or height < 1:
+            results.append(None)
+            continue
+        if crop_size:
+            width = height = max(width, height)  # Square crops keep the aspect ratio when resized
+        center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+        width, height = width * (1 + 2 * padding), height * (1 + 2 * padding)
+        
+        # Regions outside the image are filled with black
+        crop = img.crop((round(center_x - width / 2), round(center_y - height / 2),
+                         round(center_x + width / 2), round(center_y + height / 2)))
+        if crop_size:
+            crop = crop.resize((crop_size, crop_size), Image.Resampling.LANCZOS)
+        
+        if dest_path:
+            crop.save(dest_path, image_format, quality=quality)
+            results.append((list(crop.size), None))
+        else:
+            buffer = io.BytesIO()
+            crop.save(buffer, image_format, quality=quality)
+            results.append((list(crop.size), buffer.getvalue()))
+    return results
+
+# Channel count reported for each PIL mode ('P' images load as RGB)
+MODE_CHANNELS = {'1': 1, 'L': 1, 'I': 1, 'I;16': 1, 'F': 1, 'LA': 2, 'P': 3, 'RGB': 3, 'YCbCr': 3, 'RGBA': 4, 'CMYK': 4}
+
+def read_image_metadata(image_path):
+    """Read dimensions, mode, format, EXIF orientation and content hash without decoding pixels"""
+    with Image.open(image_path) as img:
+        width, height = img.size
+        mode = img.mode
+        image_format = img.format
+        try:
+            orientation = int(img.getexif().get(0x0112, 1))
+        except Exception:
+            orientation = 1
+        frames = getattr(img, 'n_frames', 1)
+    
+    return {
+        'width': width,
+        'height': height,
+        'mode': mode,
+        'format': image_format,
+        'orientation': orientation,
+        'frames': frames,
+        'sha1': file_sha1(image_path)
+    }
+
+def read_frame_count(image_path):
+    """Return the number of frames in an image from its headers, or 1 if it cannot be read"""
+    try:
+        with Image.open(image_path) as img:
+            return getattr(img, 'n_frames', 1)
+    except (OSError, SyntaxError, ValueError):
+        return 1
+
+class ImageCatalog:
+    """Persistent metadata catalog for the images in the unlabeled folder
+
+    Stores size, mode, format, real extension, EXIF orientation, frame count
+    and a content hash per image in a local SQLite file. ``refresh`` only re-reads files whose
+    size or modification time changed, using header-only reads on a thread pool.
+    """
+
+    columns = ('name', 'stem', 'extension', 'file_size', 'mtime_ns', 'width', 'height',
+               'mode', 'format', 'orientation', 'frames', 'sha1')
+
+    def __init__(self, db_path, image_dir, max_workers=8):
+        self.image_dir = image_dir
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.progress = (0, 0)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            # Rebuild catalogs written before a column was added
+            existing = [row[1] for row in self.conn.execute("PRAGMA table_info(images)")]
+            if existing and set(existing) != set(self.columns):
+                self.conn.execute("DROP TABLE images")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "name TEXT PRIMARY KEY, stem TEXT NOT NULL, extension TEXT NOT NULL, "
+                "file_size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "width INTEGER NOT NULL, height INTEGER NOT NULL, mode TEXT, format TEXT, "
+                "orientation INTEGER NOT NULL DEFAULT 1, frames INTEGER NOT NULL DEFAULT 1, "
+                "sha1 TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS images_stem ON images (stem)")
+    
+    def _read(self, item):
+        name, file_size, mtime_ns = item
+        try:
+            metadata = read_image_metadata(os.path.join(self.image_dir, name))
+        except Exception as e:
+            print(f"Error reading image metadata for {name}: {e}")
+            return None
+        stem, extension = os.path.splitext(name)
+        return dict(metadata, name=name, stem=stem, extension=extension, file_size=file_size, mtime_ns=mtime_ns)
+    
+    def _store(self, entries, removed=()):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO images ({', '.join(self.columns)}) "
+                f"VALUES ({', '.join('?' * len(self.columns))})",
+                [tuple(entry[column] for column in self.columns) for entry in entries]
+            )
+            self.conn.executemany("DELETE FROM images WHERE name = ?", [(name,) for name in removed])
+    
+    def _rows(self, query, params=()):
+        with self.lock:
+            cursor = self.conn.execute(f"SELECT {', '.join(self.columns)} FROM images {query}", params)
+            return [dict(zip(self.columns, row)) for row in cursor.fetchall()]
+    
+    def refresh(self):
+        """Bring the catalog up to date with the image folder, returning the number of images re-read
+
+        Concurrent calls run one after the other, so a refresh started while
+        another is running only re-reads what changed since. ``progress`` holds
+        (images read, images to read) while it runs.
+        """
+        with self.refresh_lock:
+            return self._refresh()
+    
+    def _refresh(self):
+        current = {}
+        with os.scandir(self.image_dir) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name.lower())[1] in IMAGE_EXTENSIONS and entry.is_file():
+                    stat = entry.stat()
+                    current[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        
+        with self.lock:
+            known = {
+                name: (file_size, mtime_ns)
+                for name, file_size, mtime_ns in self.conn.execute("SELECT name, file_size, mtime_ns FROM images")
+            }
+        
+        stale = [(name,) + stat for name, stat in current.items() if known.get(name) != stat]
+        removed = [name for name in known if name not in current]
+        
+        entries = []
+        self.progress = (0, len(stale))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for done, entry in enumerate(bounded_map(executor, self._read, stale, window=self.max_workers * 4), 1):
+                self.progress = (done, len(stale))
+                if entry:
+                    entries.append(entry)
+                # Commit in batches so an interrupted refresh keeps its progress
+                if len(entries) >= 1000:
+                    self._store(entries)
+                    entries = []
+        self._store(entries, removed)
+        return len(stale)
+    
+    def lookup(self, name, read=True):
+        """Return the entry for one image, re-reading it first if it changed on disk
+
+        With read=False, images that are new or changed return None instead, so
+        callers on the GUI thread never wait for a full-file hash.
+        """
+        image_path = os.path.join(self.image_dir, name)
+        if not os.path.isfile(image_path):
+            return None
+        stat = os.stat(image_path)
+        rows = self._rows("WHERE name = ?", (name,))
+        if rows and (rows[0]['file_size'], rows[0]['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return rows[0]
+        if not read:
+            return None
+        
+        entry = self._read((name, stat.st_size, stat.st_mtime_ns))
+        if entry:
+            self._store([entry])
+        return entry
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
 class DataLabeler:
     def __init__(self, root):
         self.root = root
@@ -15,6 +1630,8 @@ class DataLabeler:
         # Initialize variables
         self.current_image = None
         self.current_image_path = None
+        self.current_image_key = None
+        self.propagation_source = None
         self.photo = None
         self.canvas_image = None
         self.labels = []
@@ -39,8 +1656,24 @@ class DataLabeler:
         os.makedirs(os.path.join(self.pytorch_path, "annotations"), exist_ok=True)
         os.makedirs(os.path.join(self.pytorch_path, "images"), exist_ok=True)
         
+        # Shared work queue so several labeler instances never label the same image
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.work_queue = WorkQueue(os.path.join(self.labeled_path, "work_queue.sqlite3"), self.instance_id)
+        
+        # Header-only metadata for every image, warmed in the background
+        self.image_catalog = ImageCatalog(os.path.join(self.labeled_path, "image_catalog.sqlite3"), self.unlabeled_path)
+        threading.Thread(target=self.image_catalog.refresh, daemon=True).start()
+        
+        # In-memory annotation index served by the optional local API
+        self.annotation_index = AnnotationIndex(self.labeled_path, self.labels, self.work_queue.db_path)
+        self.annotation_server = None
+        
         self.setup_ui()
         
+        # Keep our lease alive while the image is open and release it on exit
+        self.root.after(self.work_queue.lease_seconds * 1000 // 3, self.renew_lease)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
     def setup_ui(self):
         # Main frame
         main_frame = ttk.Frame(self.root, padding="10")
@@ -64,6 +1697,20 @@ class DataLabeler:
         ttk.Button(file_frame, text="Next Image", command=self.next_image).pack(fill=tk.X, pady=2)
         ttk.Button(file_frame, text="Previous Image", command=self.prev_image).pack(fill=tk.X, pady=2)
         
+        self.use_work_queue = tk.BooleanVar(value=True)
+        ttk.Checkbutton(file_frame, text="Next skips labeled/leased images", variable=self.use_work_queue).pack(anchor=tk.W, pady=2)
+        
+        self.propagate_on_next = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Carry boxes to next frame", variable=self.propagate_on_next).pack(anchor=tk.W, pady=2)
+        
+        # Dataset import
+        import_frame = ttk.LabelFrame(control_frame, text="Import", padding="5")
+        import_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Button(import_frame, text="Import COCO JSON", command=self.import_coco_dataset).pack(fill=tk.X, pady=2)
+        ttk.Button(import_frame, text="Import VOC Folder", command=self.import_voc_dataset).pack(fill=tk.X, pady=2)
+        ttk.Button(import_frame, text="Import YOLO Folder", command=self.import_yolo_dataset).pack(fill=tk.X, pady=2)
+        
         # Label management
         label_frame = ttk.LabelFrame(control_frame, text="Label Management", padding="5")
         label_frame.pack(fill=tk.X, pady=(0, 10))
@@ -114,6 +1761,53 @@ class DataLabeler:
         
         ttk.Button(save_frame, text="Save Annotations", command=self.save_annotations).pack(fill=tk.X, pady=2)
         ttk.Button(save_frame, text="Export PyTorch Dataset", command=self.export_pytorch_dataset).pack(fill=tk.X, pady=2)
+        ttk.Button(save_frame, text="Export YOLO Dataset", command=self.export_yolo_dataset).pack(fill=tk.X, pady=2)
+        ttk.Button(save_frame, text="Export Object Crops", command=self.export_object_crops).pack(fill=tk.X, pady=2)
+        
+        # Export options
+        export_frame = ttk.LabelFrame(control_frame, text="Export Options", padding="5")
+        export_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(export_frame, text="Image format:").pack(anchor=tk.W)
+        self.export_format = tk.StringVar(value="Original")
+        ttk.Combobox(export_frame, textvariable=self.export_format, values=["Original"] + list(TRANSCODE_FORMATS),
+                     state="readonly", width=10).pack(anchor=tk.W, pady=2)
+        
+        ttk.Label(export_frame, text="Quality / max side (0 = keep size):").pack(anchor=tk.W)
+        encode_frame = ttk.Frame(export_frame)
+        encode_frame.pack(anchor=tk.W, pady=2)
+        self.export_quality = tk.IntVar(value=90)
+        ttk.Spinbox(encode_frame, from_=1, to=100, textvariable=self.export_quality, width=5).pack(side=tk.LEFT)
+        self.export_max_side = tk.IntVar(value=0)
+        ttk.Spinbox(encode_frame, from_=0, to=16384, increment=64, textvariable=self.export_max_side, width=7).pack(side=tk.LEFT, padx=(5, 0))
+        
+        ttk.Label(export_frame, text="Augmented copies per train image:").pack(anchor=tk.W)
+        self.augment_variants = tk.IntVar(value=0)
+        ttk.Spinbox(export_frame, from_=0, to=20, textvariable=self.augment_variants, width=6).pack(anchor=tk.W, pady=2)
+        
+        ttk.Label(export_frame, text="Augmentation seed:").pack(anchor=tk.W)
+        self.augment_seed = tk.IntVar(value=0)
+        ttk.Entry(export_frame, textvariable=self.augment_seed, width=8).pack(anchor=tk.W, pady=2)
+        
+        ttk.Label(export_frame, text="Crop padding / size (0 = keep size):").pack(anchor=tk.W)
+        crop_frame = ttk.Frame(export_frame)
+        crop_frame.pack(anchor=tk.W, pady=2)
+        self.crop_padding = tk.DoubleVar(value=0.0)
+        ttk.Spinbox(crop_frame, from_=0.0, to=1.0, increment=0.05, textvariable=self.crop_padding, width=5).pack(side=tk.LEFT)
+        self.crop_size = tk.IntVar(value=0)
+        ttk.Spinbox(crop_frame, from_=0, to=1024, increment=32, textvariable=self.crop_size, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        
+        ttk.Label(export_frame, text="Crop layout:").pack(anchor=tk.W)
+        self.crop_layout = tk.StringVar(value="Class folders")
+        ttk.Combobox(export_frame, textvariable=self.crop_layout, values=["Class folders", "Tar shards"],
+                     state="readonly", width=14).pack(anchor=tk.W, pady=2)
+        
+        # Local services
+        service_frame = ttk.LabelFrame(control_frame, text="Services", padding="5")
+        service_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.server_button = ttk.Button(service_frame, text="Start Annotation API", command=self.toggle_annotation_server)
+        self.server_button.pack(fill=tk.X, pady=2)
         
         # Image display
         canvas_frame = ttk.LabelFrame(main_frame, text="Image", padding="5")
@@ -149,7 +1843,8 @@ class DataLabeler:
     def load_image(self):
         """Load an image from the unlabeled data folder"""
         filetypes = [
-            ("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.gif"),
+            ("Image files", "*.jpg *.jpeg *.png *.bmp *.tif *.tiff *.gif"),
+            ("Image archives", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz"),
             ("All files", "*.*")
         ]
         
@@ -159,14 +1854,27 @@ class DataLabeler:
             filetypes=filetypes
         )
         
+        if file_path and is_archive(file_path):
+            # Open the first image inside the archive
+            try:
+                members = get_archive(file_path).names()
+            except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+                messagebox.showerror("Error", f"Failed to open archive: {str(e)}")
+                return
+            if not members:
+                messagebox.showinfo("Info", "No images found in archive")
+                return
+            file_path = f"{file_path}{KEY_SEPARATOR}{members[0]}"
+        
         if file_path:
             self.load_image_file(file_path)
     
     def load_image_file(self, file_path):
-        """Load a specific image file"""
+        """Load a specific image file, archive member or frame"""
         try:
             self.current_image_path = file_path
-            self.current_image = Image.open(file_path)
+            self.current_image_key = image_key(file_path)
+            self.current_image = open_image(file_path)
             
             # Clear previous annotations
             self.clear_annotations()
@@ -194,14 +1902,40 @@ class DataLabeler:
             # Load existing annotations if they exist
             self.load_existing_annotations()
             
-            filename = os.path.basename(file_path)
-            self.status_var.set(f"Loaded: {filename}")
+            # Otherwise propose the previous frame's boxes, tracked into this frame
+            untracked = 0
+            if self.propagation_source and not self.rectangles:
+                untracked = self.propagate_previous_boxes()
+            
+            filename = self.current_image_key
+            status = f"Loaded: {filename}"
+            if not self.work_queue.acquire(filename):
+                status += f" (currently leased by {self.work_queue.holder(filename)})"
+            if untracked:
+                status += f" - {untracked} carried boxes could not be tracked, check their position"
+            self.status_var.set(status)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
     
     def next_image(self):
         """Load the next image in the unlabeled folder"""
+        if self.propagate_on_next.get() and self.current_image and self.rectangles:
+            self.propagation_source = (
+                self.current_image,
+                [(annotation['label'], list(annotation['bbox'])) for annotation in self.rectangles]
+            )
+        
+        try:
+            if self.use_work_queue.get():
+                self.next_queued_image()
+            else:
+                self.next_sequential_image()
+        finally:
+            self.propagation_source = None
+    
+    def next_sequential_image(self):
+        """Load the image after the current one, labeled or not"""
         if not self.current_image_path:
             messagebox.showwarning("Warning", "No image currently loaded")
             return
@@ -212,7 +1946,7 @@ class DataLabeler:
                 messagebox.showinfo("Info", "No images found in unlabeled folder")
                 return
                 
-            current_file = os.path.basename(self.current_image_path)
+            current_file = self.current_image_key
             if current_file in files:
                 current_index = files.index(current_file)
                 next_index = (current_index + 1) % len(files)
@@ -233,7 +1967,7 @@ class DataLabeler:
                 messagebox.showinfo("Info", "No images found in unlabeled folder")
                 return
                 
-            current_file = os.path.basename(self.current_image_path)
+            current_file = self.current_image_key
             if current_file in files:
                 current_index = files.index(current_file)
                 prev_index = (current_index - 1) % len(files)
@@ -242,21 +1976,136 @@ class DataLabeler:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load previous image: {str(e)}")
     
+    def next_queued_image(self):
+        """Lease and load the next image that is unlabeled and not leased by another instance"""
+        try:
+            files = self.get_image_files()
+            if not files:
+                messagebox.showinfo("Info", "No images found in unlabeled folder")
+                return
+            
+            # Start after the current image and wrap around
+            start = 0
+            if self.current_image_path:
+                current_file = self.current_image_key
+                if current_file in files:
+                    start = files.index(current_file) + 1
+            candidates = files[start:] + files[:start]
+            
+            labeled = {
+                os.path.splitext(f)[0] for f in os.listdir(self.labeled_path)
+                if f.endswith('.json')
+            }
+            next_file = self.work_queue.lease_next(candidates, labeled)
+            if next_file is None:
+                messagebox.showinfo("Info", "No unlabeled images left that are not leased by another labeler")
+                return
+            
+            self.load_image_file(os.path.join(self.unlabeled_path, next_file))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load next image: {str(e)}")
+    
+    def renew_lease(self):
+        """Periodically extend the lease on the open image"""
+        try:
+            self.work_queue.renew()
+        except sqlite3.Error as e:
+            print(f"Error renewing image lease: {e}")
+        self.root.after(self.work_queue.lease_seconds * 1000 // 3, self.renew_lease)
+    
+    def on_close(self):
+        """Release leases before closing the window"""
+        if self.annotation_server:
+            self.annotation_server.stop()
+        try:
+            self.work_queue.close()
+            self.image_catalog.close()
+        except sqlite3.Error as e:
+            print(f"Error releasing image leases: {e}")
+        self.root.destroy()
+    
+    def toggle_annotation_server(self):
+        """Start or stop the local annotation API server"""
+        if self.annotation_server:
+            self.annotation_server.stop()
+            self.annotation_server = None
+            self.server_button.config(text="Start Annotation API")
+            self.status_var.set("Stopped annotation API")
+            return
+        
+        port = simpledialog.askinteger(
+            "Annotation API",
+            "Port to serve annotations on (localhost only):",
+            initialvalue=8765,
+            minvalue=1024,
+            maxvalue=65535
+        )
+        if port is None:
+            return
+        
+        try:
+            self.annotation_index.refresh()
+            server = AnnotationServer(self.annotation_index, port=port)
+            server.start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to start annotation API: {str(e)}")
+            return
+        
+        self.annotation_server = server
+        self.server_button.config(text="Stop Annotation API")
+        self.status_var.set(f"Serving annotations on http://127.0.0.1:{port}")
+        self.sync_labels_listbox()
+    
+    def sync_labels_listbox(self):
+        """Show labels added through the API while the server is running"""
+        if not self.annotation_server:
+            return
+        self.refresh_labels_listbox()
+        self.root.after(1000, self.sync_labels_listbox)
+    
+    def refresh_labels_listbox(self):
+        """Rebuild the labels listbox if labels were added outside the GUI"""
+        with self.annotation_index.lock:
+            labels = list(self.labels)
+        if list(self.labels_listbox.get(0, tk.END)) != labels:
+            self.labels_listbox.delete(0, tk.END)
+            for label in labels:
+                self.labels_listbox.insert(tk.END, label)
+    
     def get_image_files(self):
-        """Get list of image files in unlabeled folder"""
-        extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
+        """Get list of image keys in unlabeled folder, including archive members and frames"""
         files = []
         for file in os.listdir(self.unlabeled_path):
-            if os.path.splitext(file.lower())[1] in extensions:
+            ext = os.path.splitext(file.lower())[1]
+            if is_archive(file):
+                try:
+                    archive = get_archive(os.path.join(self.unlabeled_path, file))
+                except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+                    print(f"Error reading archive {file}: {e}")
+                    continue
+                files.extend(f"{file}{KEY_SEPARATOR}{member}" for member in archive.names())
+            elif ext in MULTI_FRAME_EXTENSIONS:
+                # Frame counts come from the catalog; uncatalogued files get a header-only
+                # read and are hashed later by the background refresh
+                entry = self.image_catalog.lookup(file, read=False)
+                frames = entry['frames'] if entry else read_frame_count(os.path.join(self.unlabeled_path, file))
+                if frames > 1:
+                    files.extend(f"{file}{KEY_SEPARATOR}frame{i}" for i in range(frames))
+                else:
+                    files.append(file)
+            elif ext in IMAGE_EXTENSIONS:
                 files.append(file)
         return sorted(files)
     
     def add_label(self):
         """Add a new label to the list"""
         label = self.label_entry.get().strip()
-        if label and label not in self.labels:
-            self.labels.append(label)
-            self.labels_listbox.insert(tk.END, label)
+        with self.annotation_index.lock:  # The API may add labels concurrently
+            added = bool(label) and label not in self.labels
+            if added:
+                self.labels.append(label)
+        if added:
+            self.refresh_labels_listbox()
             self.label_entry.delete(0, tk.END)
             self.status_var.set(f"Added label: {label}")
     
@@ -265,9 +2114,9 @@ class DataLabeler:
         selection = self.labels_listbox.curselection()
         if selection:
             index = selection[0]
-            removed_label = self.labels[index]
-            del self.labels[index]
-            self.labels_listbox.delete(index)
+            with self.annotation_index.lock:
+                removed_label = self.labels.pop(index)
+            self.refresh_labels_listbox()
             self.status_var.set(f"Removed label: {removed_label}")
     
     def on_label_select(self, event):
@@ -369,6 +2218,8 @@ class DataLabeler:
         for i, annotation in enumerate(self.rectangles):
             bbox = annotation['bbox']
             text = f"{i+1}. {annotation['label']} ({bbox[0]:.0f},{bbox[1]:.0f},{bbox[2]:.0f},{bbox[3]:.0f})"
+            if annotation.get('low_confidence'):
+                text += " - check position"
             self.annotations_listbox.insert(tk.END, text)
     
     def save_annotations(self):
@@ -377,59 +2228,46 @@ class DataLabeler:
             messagebox.showwarning("Warning", "No image loaded or no annotations to save")
             return
             
+        # Refuse to silently overwrite work from another labeler holding the lease
+        image_name = self.current_image_key
+        if not self.work_queue.acquire(image_name):
+            holder = self.work_queue.holder(image_name)
+            if not messagebox.askyesno(
+                "Image Leased",
+                f"{image_name} is currently being labeled by {holder}.\n\nSave anyway and overwrite their annotations?"
+            ):
+                return
+            
         try:
-            # Get image filename without extension
-            filename = os.path.splitext(os.path.basename(self.current_image_path))[0]
+            # Get annotation file name (archive members and frames get unique stems)
+            filename = annotation_stem(self.current_image_key)
             save_format = self.save_format.get()
             
             img_width, img_height = self.current_image.size
             
+            # The JSON record is always saved: the work queue, API and exports read it
+            annotations_data = {
+                'image_path': self.current_image_path,
+                'image_size': [img_width, img_height],
+                'labels': self.labels,
+                'annotations': []
+            }
+            
+            for annotation in self.rectangles:
+                annotations_data['annotations'].append({
+                    'label': annotation['label'],
+                    'bbox': annotation['bbox']
+                })
+            
             if save_format in ["all", "yolo"]:
-                # Save in YOLO format
-                txt_path = os.path.join(self.labeled_path, f"{filename}.txt")
-                json_path = os.path.join(self.labeled_path, f"{filename}.json")
-                
-                # Save YOLO format (class_id center_x center_y width height - normalized)
-                with open(txt_path, 'w') as f:
-                    for annotation in self.rectangles:
-                        label = annotation['label']
-                        if label in self.labels:
-                            class_id = self.labels.index(label)
-                        else:
-                            class_id = 0
-                        
-                        x1, y1, x2, y2 = annotation['bbox']
-                        
-                        # Convert to YOLO format (normalized center coordinates and dimensions)
-                        center_x = (x1 + x2) / 2 / img_width
-                        center_y = (y1 + y2) / 2 / img_height
-                        width = (x2 - x1) / img_width
-                        height = (y2 - y1) / img_height
-                        
-                        f.write(f"{class_id} {center_x:.6f} {center_y:.6f} {width:.6f} {height:.6f}\n")
-                
-                # Save JSON format for easier reading
-                annotations_data = {
-                    'image_path': self.current_image_path,
-                    'image_size': [img_width, img_height],
-                    'labels': self.labels,
-                    'annotations': []
-                }
-                
-                for annotation in self.rectangles:
-                    annotations_data['annotations'].append({
-                        'label': annotation['label'],
-                        'bbox': annotation['bbox']
-                    })
-                
-                with open(json_path, 'w') as f:
-                    json.dump(annotations_data, f, indent=2)
-                
-                # Also save labels list
-                labels_path = os.path.join(self.labeled_path, "classes.txt")
-                with open(labels_path, 'w') as f:
-                    for label in self.labels:
-                        f.write(f"{label}\n")
+                # Save in YOLO format alongside the JSON
+                write_yolo_annotations(self.labeled_path, filename, annotations_data, self.labels)
+            else:
+                write_json_atomic(os.path.join(self.labeled_path, f"{filename}.json"), annotations_data)
+            self.annotation_index.update(filename, dict(annotations_data, labels=list(self.labels)))
+            
+            # Also save labels list
+            write_classes_file(self.labeled_path, self.labels)
             
             if save_format in ["all", "pytorch"]:
                 # Save PyTorch formats
@@ -441,53 +2279,29 @@ class DataLabeler:
             if save_format == "yolo":
                 messagebox.showinfo("Success", f"YOLO annotations saved successfully!\n\nFiles created:\n- {filename}.txt (YOLO format)\n- {filename}.json (readable format)\n- classes.txt (label definitions)")
             elif save_format == "pytorch":
-                messagebox.showinfo("Success", f"PyTorch annotations saved successfully!\n\nFiles created:\n- {filename}_coco.json (COCO format)\n- {filename}.xml (Pascal VOC format)\n- {filename}_pytorch.json (PyTorch format)")
+                messagebox.showinfo("Success", f"PyTorch annotations saved successfully!\n\nFiles created:\n- {filename}_coco.json (COCO format)\n- {filename}.xml (Pascal VOC format)\n- {filename}_pytorch.json (PyTorch format)\n- {filename}.json (readable format)")
             else:
                 messagebox.showinfo("Success", f"All format annotations saved successfully!\n\nYOLO files: {filename}.txt, {filename}.json, classes.txt\nPyTorch files: {filename}_coco.json, {filename}.xml, {filename}_pytorch.json")
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save annotations: {str(e)}")
     
+    def current_image_info(self):
+        """Return (file_name, channels) for the current image from the image catalog"""
+        file_name = export_image_name(self.current_image_key)
+        entry = None
+        in_unlabeled = os.path.abspath(os.path.dirname(self.current_image_path)) == os.path.abspath(self.unlabeled_path)
+        if in_unlabeled and KEY_SEPARATOR not in self.current_image_key:
+            entry = self.image_catalog.lookup(file_name)
+        mode = entry['mode'] if entry else self.current_image.mode
+        return file_name, MODE_CHANNELS.get(mode, 3)
+    
     def save_pytorch_formats(self, filename, img_width, img_height):
         """Save annotations in PyTorch-compatible formats"""
-        # 1. COCO format (commonly used with torchvision)
-        coco_data = {
-            "images": [{
-                "id": 1,
-                "width": img_width,
-                "height": img_height,
-                "file_name": f"{filename}.jpg"  # Assume jpg, adjust as needed
-            }],
-            "annotations": [],
-            "categories": []
-        }
-        
-        # Add categories
-        for i, label in enumerate(self.labels):
-            coco_data["categories"].append({
-                "id": i + 1,  # COCO categories start from 1
-                "name": label,
-                "supercategory": "object"
-            })
+        image_file, channels = self.current_image_info()
         
-        # Add annotations
-        for ann_id, annotation in enumerate(self.rectangles):
-            x1, y1, x2, y2 = annotation['bbox']
-            width = x2 - x1
-            height = y2 - y1
-            area = width * height
-            
-            label = annotation['label']
-            category_id = self.labels.index(label) + 1 if label in self.labels else 1
-            
-            coco_data["annotations"].append({
-                "id": ann_id + 1,
-                "image_id": 1,
-                "category_id": category_id,
-                "bbox": [x1, y1, width, height],  # COCO format: [x, y, width, height]
-                "area": area,
-                "iscrowd": 0
-            })
+        # 1. COCO format (commonly used with torchvision)
+        coco_data = coco_annotation_data(image_file, img_width, img_height, self.rectangles, self.labels)
         
         # Save COCO format
         coco_path = os.path.join(self.pytorch_path, "annotations", f"{filename}_coco.json")
@@ -498,28 +2312,7 @@ class DataLabeler:
         self.save_pascal_voc_format(filename, img_width, img_height)
         
         # 3. PyTorch custom format
-        pytorch_data = {
-            "image_info": {
-                "filename": f"{filename}.jpg",
-                "width": img_width,
-                "height": img_height,
-                "channels": 3
-            },
-            "annotations": [],
-            "classes": {label: i for i, label in enumerate(self.labels)}
-        }
-        
-        for annotation in self.rectangles:
-            x1, y1, x2, y2 = annotation['bbox']
-            label = annotation['label']
-            class_id = self.labels.index(label) if label in self.labels else 0
-            
-            pytorch_data["annotations"].append({
-                "class_id": class_id,
-                "class_name": label,
-                "bbox": [x1, y1, x2, y2],  # [x1, y1, x2, y2] format
-                "bbox_mode": "xyxy"
-            })
+        pytorch_data = pytorch_annotation_data(image_file, img_width, img_height, channels, self.rectangles, self.labels)
         
         # Save PyTorch format
         pytorch_path = os.path.join(self.pytorch_path, "annotations", f"{filename}_pytorch.json")
@@ -528,136 +2321,216 @@ class DataLabeler:
     
     def save_pascal_voc_format(self, filename, img_width, img_height):
         """Save annotations in Pascal VOC XML format"""
-        annotation = ET.Element("annotation")
-        
-        # Add folder
-        folder = ET.SubElement(annotation, "folder")
-        folder.text = "images"
-        
-        # Add filename
-        filename_elem = ET.SubElement(annotation, "filename")
-        filename_elem.text = f"{filename}.jpg"
-        
-        # Add path
-        path = ET.SubElement(annotation, "path")
-        path.text = self.current_image_path
-        
-        # Add source
-        source = ET.SubElement(annotation, "source")
-        database = ET.SubElement(source, "database")
-        database.text = "Unknown"
-        
-        # Add size
-        size = ET.SubElement(annotation, "size")
-        width = ET.SubElement(size, "width")
-        width.text = str(img_width)
-        height = ET.SubElement(size, "height")
-        height.text = str(img_height)
-        depth = ET.SubElement(size, "depth")
-        depth.text = "3"
-        
-        # Add segmented
-        segmented = ET.SubElement(annotation, "segmented")
-        segmented.text = "0"
-        
-        # Add objects
-        for rect_annotation in self.rectangles:
-            obj = ET.SubElement(annotation, "object")
-            
-            name = ET.SubElement(obj, "name")
-            name.text = rect_annotation['label']
-            
-            pose = ET.SubElement(obj, "pose")
-            pose.text = "Unspecified"
-            
-            truncated = ET.SubElement(obj, "truncated")
-            truncated.text = "0"
-            
-            difficult = ET.SubElement(obj, "difficult")
-            difficult.text = "0"
-            
-            bndbox = ET.SubElement(obj, "bndbox")
-            x1, y1, x2, y2 = rect_annotation['bbox']
-            
-            xmin = ET.SubElement(bndbox, "xmin")
-            xmin.text = str(int(x1))
-            ymin = ET.SubElement(bndbox, "ymin")
-            ymin.text = str(int(y1))
-            xmax = ET.SubElement(bndbox, "xmax")
-            xmax.text = str(int(x2))
-            ymax = ET.SubElement(bndbox, "ymax")
-            ymax.text = str(int(y2))
+        image_file, channels = self.current_image_info()
+        tree = voc_annotation_tree(image_file, self.current_image_path, img_width, img_height, channels, self.rectangles)
         
         # Save XML file
-        tree = ET.ElementTree(annotation)
         xml_path = os.path.join(self.pytorch_path, "annotations", f"{filename}.xml")
         tree.write(xml_path, encoding='utf-8', xml_declaration=True)
     
+    def collect_labeled_files(self):
+        """Return the annotation stems of every labeled image"""
+        labeled_files = []
+        for file in os.listdir(self.labeled_path):
+            if file.endswith('.json') and not file == 'classes.txt':
+                labeled_files.append(file.replace('.json', ''))
+        return labeled_files
+    
+    def ask_train_split(self, labeled_files):
+        """Ask for the train/val split ratio and shuffle labeled_files into (train, val, ratio)"""
+        split_ratio = simpledialog.askfloat(
+            "Train/Val Split", 
+            "Enter train split ratio (0.0-1.0):\n(e.g., 0.8 for 80% train, 20% val)",
+            initialvalue=0.8,
+            minvalue=0.1,
+            maxvalue=0.9
+        )
+        
+        if split_ratio is None:
+            return None
+        
+        # Seeded so every export with the same augmentation seed gets the same split
+        labeled_files = sorted(labeled_files)
+        random.Random(self.augment_seed.get()).shuffle(labeled_files)
+        split_idx = int(len(labeled_files) * split_ratio)
+        return labeled_files[:split_idx], labeled_files[split_idx:], split_ratio
+    
+    def refresh_image_catalog(self):
+        """Refresh the image catalog on a background thread, keeping the window responsive"""
+        worker = threading.Thread(target=self.image_catalog.refresh, daemon=True)
+        worker.start()
+        while worker.is_alive():
+            done, total = self.image_catalog.progress
+            self.status_var.set(f"Scanning images... {done}/{total}")
+            self.root.update()
+            worker.join(0.05)
+    
+    def resolve_image_keys(self):
+        """Map annotation stems to image keys (loose files, archive members and frames)"""
+        # The catalog supplies frame counts, so nothing is probed or decoded
+        self.refresh_image_catalog()
+        return {annotation_stem(key): key for key in self.get_image_files()}
+    
+    def export_split_images(self, splits, images_dir):
+        """Copy or transcode the images of each (split name, stems) pair into images_dir/<split name>
+
+        Returns ({split name: [(stem, image path, [width, height], channels, annotations)]},
+        stems without an image, stats). With an image format chosen in Export
+        Options the images are re-encoded on a process pool and the boxes are
+        mapped to the new pixels. Images that fail to export are left out and
+        listed in stats['failed_images'].
+        """
+        image_keys = self.resolve_image_keys()
+        target = TRANSCODE_FORMATS.get(self.export_format.get())
+        quality = self.export_quality.get()
+        max_side = self.export_max_side.get()
+        records = {split_name: [] for split_name, _ in splits}
+        missing_images = []
+        stats = {'image_formats': {}, 'source_bytes': 0, 'exported_bytes': 0, 'failed_images': []}
+        
+        def image_failed(filename, error):
+            print(f"Error exporting image {filename}: {error}")
+            stats['failed_images'].append(filename)
+        
+        def prepare(item):
+            # Read the annotations and copy (or stage) the image on a thread
+            split_name, filename = item
+            key = image_keys.get(filename)
+            if not key:
+                return split_name, filename, None, None, None
+            with open(os.path.join(self.labeled_path, f"{filename}.json"), 'r') as f:
+                data = json.load(f)
+            
+            dest_name = export_image_name(key)
+            entry = self.image_catalog.lookup(key) if KEY_SEPARATOR not in key else None
+            image_format = entry['format'] if entry else FORMAT_BY_EXTENSION.get(os.path.splitext(dest_name)[1].lower())
+            source_path = os.path.join(self.unlabeled_path, key)
+            if target is None:
+                # Archive members are streamed without extraction
+                dest_path = os.path.join(images_dir, split_name, dest_name)
+                try:
+                    copy_image(source_path, dest_path)
+                    with Image.open(dest_path) as img:
+                        channels = MODE_CHANNELS.get(img.mode, len(img.getbands()))
+                except Exception:
+                    if os.path.exists(dest_path):
+                        os.remove(dest_path)  # No unlabeled image is left in the dataset
+                    raise
+                return split_name, filename, data, image_format, (dest_path, channels)
+            
+            # Archive members and frames are staged so workers only open plain files
+            staged = KEY_SEPARATOR in key
+            if staged:
+                staging_path = os.path.join(images_dir, split_name, f".staging_{dest_name}")
+                copy_image(source_path, staging_path)
+                source_path = staging_path
+            dest_path = os.path.join(images_dir, split_name, os.path.splitext(dest_name)[0] + target[1])
+            boxes = [annotation['bbox'] for annotation in data['annotations']]
+            return split_name, filename, data, image_format, (source_path, dest_path, target[0], quality, max_side, boxes, staged)
+        
+        def count_image(filename, data, image_format):
+            if data is None:
+                missing_images.append(filename)
+                return False
+            stats['image_formats'][image_format] = stats['image_formats'].get(image_format, 0) + 1
+            return True
+        
+        items = ((split_name, filename) for split_name, files in splits for filename in files)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            prepared = (result for result in bounded_map(executor, prepare, items, window=64,
+                                                          on_error=lambda item, e: image_failed(item[1], e))
+                        if result is not None)
+            if target is None:
+                for split_name, filename, data, image_format, copied in prepared:
+                    if count_image(filename, data, image_format):
+                        image_path, channels = copied
+                        image_bytes = os.path.getsize(image_path)
+                        stats['source_bytes'] += image_bytes
+                        stats['exported_bytes'] += image_bytes
+                        records[split_name].append((filename, image_path, data['image_size'], channels, data['annotations']))
+            else:
+                in_flight = deque()
+                
+                def jobs():
+                    for split_name, filename, data, image_format, job in prepared:
+                        if count_image(filename, data, image_format):
+                            in_flight.append((split_name, filename, job[1], data['annotations']))
+                            yield job
+                
+                with process_pool() as processes:
+                    for result in bounded_map(processes, transcode_image, jobs(), window=64,
+                                              on_error=lambda job, e: e):
+                        split_name, filename, image_path, annotations = in_flight.popleft()
+                        if isinstance(result, Exception):
+                            image_failed(filename, result)
+                            continue
+                        source_bytes, exported_bytes, image_size, channels, boxes = result
+                        stats['source_bytes'] += source_bytes
+                        stats['exported_bytes'] += exported_bytes
+                        annotations = [dict(annotation, bbox=box) for annotation, box in zip(annotations, boxes)]
+                        records[split_name].append((filename, image_path, image_size, channels, annotations))
+        
+        return records, missing_images, stats
+    
     def export_pytorch_dataset(self):
         """Export complete PyTorch dataset with train/val split"""
         try:
             # Get all labeled images
-            labeled_files = []
-            for file in os.listdir(self.labeled_path):
-                if file.endswith('.json') and not file == 'classes.txt':
-                    labeled_files.append(file.replace('.json', ''))
+            labeled_files = self.collect_labeled_files()
             
             if not labeled_files:
                 messagebox.showwarning("Warning", "No labeled images found")
                 return
             
             # Ask for train/val split ratio
-            split_ratio = simpledialog.askfloat(
-                "Train/Val Split", 
-                "Enter train split ratio (0.0-1.0):\n(e.g., 0.8 for 80% train, 20% val)",
-                initialvalue=0.8,
-                minvalue=0.1,
-                maxvalue=0.9
-            )
-            
-            if split_ratio is None:
+            split = self.ask_train_split(labeled_files)
+            if split is None:
                 return
+            train_files, val_files, split_ratio = split
             
-            import random
-            random.shuffle(labeled_files)
-            split_idx = int(len(labeled_files) * split_ratio)
-            train_files = labeled_files[:split_idx]
-            val_files = labeled_files[split_idx:]
-            
-            # Create dataset structure
+            # Create dataset structure (split folders start empty so old exports never leak between train and val)
             dataset_path = os.path.join(self.pytorch_path, "dataset")
-            os.makedirs(dataset_path, exist_ok=True)
-            os.makedirs(os.path.join(dataset_path, "images", "train"), exist_ok=True)
-            os.makedirs(os.path.join(dataset_path, "images", "val"), exist_ok=True)
-            os.makedirs(os.path.join(dataset_path, "annotations", "train"), exist_ok=True)
-            os.makedirs(os.path.join(dataset_path, "annotations", "val"), exist_ok=True)
-            
-            # Copy and organize files
-            import shutil
-            
-            def copy_files(file_list, split_name):
-                for filename in file_list:
-                    # Copy image
-                    image_path = os.path.join(self.unlabeled_path, f"{filename}.jpg")
-                    if not os.path.exists(image_path):
-                        # Try other extensions
-                        for ext in ['.png', '.jpeg', '.bmp', '.tiff']:
-                            test_path = os.path.join(self.unlabeled_path, f"{filename}{ext}")
-                            if os.path.exists(test_path):
-                                image_path = test_path
-                                break
-                    
-                    if os.path.exists(image_path):
-                        shutil.copy2(image_path, os.path.join(dataset_path, "images", split_name))
-                    
-                    # Copy annotations
-                    for ann_file in [f"{filename}_coco.json", f"{filename}.xml", f"{filename}_pytorch.json"]:
-                        src_path = os.path.join(self.pytorch_path, "annotations", ann_file)
-                        if os.path.exists(src_path):
-                            shutil.copy2(src_path, os.path.join(dataset_path, "annotations", split_name))
+            for folder in ["images", "annotations"]:
+                for split_name in ["train", "val"]:
+                    shutil.rmtree(os.path.join(dataset_path, folder, split_name), ignore_errors=True)
+                    os.makedirs(os.path.join(dataset_path, folder, split_name))
+            
+            # Copy (or transcode) images
+            records, missing_images, stats = self.export_split_images(
+                [("train", train_files), ("val", val_files)], os.path.join(dataset_path, "images")
+            )
+            
+            for split_name, split_records in records.items():
+                ann_dir = os.path.join(dataset_path, "annotations", split_name)
+                for filename, image_path, (img_width, img_height), channels, annotations in split_records:
+                    # Built from the labeled record (with any transcoding applied), so imported
+                    # and API-ingested images get annotation files too
+                    image_file = os.path.basename(image_path)
+                    with open(os.path.join(ann_dir, f"{filename}_coco.json"), 'w') as f:
+                        json.dump(coco_annotation_data(image_file, img_width, img_height, annotations, self.labels), f, indent=2)
+                    voc_annotation_tree(image_file, image_path, img_width, img_height, channels, annotations).write(
+                        os.path.join(ann_dir, f"{filename}.xml"), encoding='utf-8', xml_declaration=True
+                    )
+                    with open(os.path.join(ann_dir, f"{filename}_pytorch.json"), 'w') as f:
+                        json.dump(pytorch_annotation_data(image_file, img_width, img_height, channels, annotations, self.labels), f, indent=2)
+            
+            # Offline augmentation of the training split
+            augmented, rendered = self.augment_exported_images(records["train"], "pytorch")
+            augmented_rows = []
+            for name, cached_path, (img_width, img_height), annotations in augmented:
+                dest_name = name + os.path.splitext(cached_path)[1]
+                link_or_copy(cached_path, os.path.join(dataset_path, "images", "train", dest_name))
+                with open(os.path.join(dataset_path, "annotations", "train", f"{name}_pytorch.json"), 'w') as f:
+                    json.dump(pytorch_annotation_data(dest_name, img_width, img_height, 3, annotations, self.labels), f, indent=2)
+                augmented_rows.append((dest_name, [img_width, img_height], annotations))
             
-            copy_files(train_files, "train")
-            copy_files(val_files, "val")
+            # All boxes in one columnar table for analytics and fast loading
+            table_path, num_boxes = self.export_annotation_table(dataset_path, [
+                (split_name, [(os.path.basename(image_path), image_size, annotations)
+                              for _, image_path, image_size, _, annotations in split_records]
+                 + (augmented_rows if split_name == "train" else []))
+                for split_name, split_records in records.items()
+            ])
             
             # Create dataset info file
             dataset_info = {
@@ -669,7 +2542,21 @@ class DataLabeler:
                 "val_images": len(val_files),
                 "total_images": len(labeled_files),
                 "train_split": split_ratio,
-                "formats": ["coco", "pascal_voc", "pytorch_custom"]
+                "augmented_train_images": len(augmented),
+                "augmentation": {
+                    "variants": self.augment_variants.get(),
+                    "seed": self.augment_seed.get(),
+                    "recipe": self.augment_recipe()
+                } if augmented else None,
+                "formats": ["coco", "pascal_voc", "pytorch_custom"],
+                "image_formats": stats['image_formats'],
+                "image_encoding": self.export_encoding(),
+                "source_image_bytes": stats['source_bytes'],
+                "exported_image_bytes": stats['exported_bytes'],
+                "missing_images": len(missing_images),
+                "failed_images": len(stats['failed_images']),
+                "annotation_table": os.path.basename(table_path),
+                "total_boxes": num_boxes
             }
             
             with open(os.path.join(dataset_path, "dataset_info.json"), 'w') as f:
@@ -683,10 +2570,15 @@ class DataLabeler:
                 f"PyTorch dataset exported successfully!\n\n"
                 f"Dataset location: {dataset_path}\n"
                 f"Train images: {len(train_files)}\n"
+                f"Augmented train images: {len(augmented)} ({rendered} rendered, {len(augmented) - rendered} reused)\n"
                 f"Val images: {len(val_files)}\n"
-                f"Classes: {len(self.labels)}\n\n"
+                f"Missing images: {len(missing_images)}\n"
+                f"Failed images: {len(stats['failed_images'])}\n"
+                f"Classes: {len(self.labels)}\n"
+                f"Image data: {stats['source_bytes'] / 1e6:.1f} MB -> {stats['exported_bytes'] / 1e6:.1f} MB\n\n"
                 f"Files created:\n"
                 f"- dataset_info.json\n"
+                f"- {os.path.basename(table_path)} ({num_boxes} boxes)\n"
                 f"- pytorch_dataset.py (example loader)\n"
                 f"- images/train/ and images/val/\n"
                 f"- annotations/train/ and annotations/val/"
@@ -695,6 +2587,412 @@ class DataLabeler:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export PyTorch dataset: {str(e)}")
     
+    def export_encoding(self):
+        """Describe the Export Options image encoding for dataset metadata (None when copying)"""
+        if self.export_format.get() not in TRANSCODE_FORMATS:
+            return None
+        return {
+            "format": self.export_format.get(),
+            "quality": self.export_quality.get(),
+            "max_side": self.export_max_side.get() or None,
+            "exif_orientation_applied": True,
+            "metadata_stripped": True
+        }
+    
+    def export_annotation_table(self, dataset_path, splits):
+        """Write every box of the exported splits as one columnar table, returning (path, box count)
+
+        splits is a list of (split name, [(image name, [width, height], annotations)]).
+        """
+        class_ids = {}
+        for i, label in enumerate(self.labels):
+            class_ids.setdefault(label, i)
+        
+        # Per-image values are repeated per box with NumPy; only the box list is walked in Python
+        names, sizes, split_codes, counts = [], [], [], []
+        coords, class_col = array('f'), array('i')
+        for split_code, (_, rows) in enumerate(splits):
+            for name, image_size, annotations in rows:
+                names.append(name)
+                sizes.append(image_size)
+                split_codes.append(split_code)
+                counts.append(len(annotations))
+                for annotation in annotations:
+                    coords.extend(annotation['bbox'])
+                class_col.extend([class_ids.get(annotation['label'], 0) for annotation in annotations])
+        
+        boxes = np.frombuffer(coords, dtype=np.float32).reshape(-1, 4) if coords else np.zeros((0, 4), np.float32)
+        sizes = np.array(sizes, dtype=np.int32).reshape(-1, 2)
+        counts = np.array(counts, dtype=np.int64)
+        table = {
+            'image': np.repeat(np.arange(len(names), dtype=np.int32), counts),
+            'image_names': names,
+            'class_id': np.frombuffer(class_col, dtype=np.int32) if class_col else np.zeros(0, np.int32),
+            'x1': boxes[:, 0],
+            'y1': boxes[:, 1],
+            'x2': boxes[:, 2],
+            'y2': boxes[:, 3],
+            'split': np.repeat(np.array(split_codes, dtype=np.int32), counts),
+            'split_names': [split_name for split_name, _ in splits],
+            'image_width': np.repeat(sizes[:, 0], counts),
+            'image_height': np.repeat(sizes[:, 1], counts)
+        }
+        path = write_annotation_table(os.path.join(dataset_path, "annotations"), table)
+        return path, len(class_col)
+    
+    def export_yolo_dataset(self):
+        """Export dataset in the standard YOLO images/labels layout with data.yaml and label caches"""
+        try:
+            labeled_files = self.collect_labeled_files()
+            
+            if not labeled_files:
+                messagebox.showwarning("Warning", "No labeled images found")
+                return
+            
+            split = self.ask_train_split(labeled_files)
+            if split is None:
+                return
+            train_files, val_files, split_ratio = split
+            
+            # Start from empty split folders so old exports never leak between train and val
+            dataset_path = os.path.abspath(os.path.join(self.labeled_path, "yolo", "dataset"))
+            for folder in ["images", "labels"]:
+                shutil.rmtree(os.path.join(dataset_path, folder), ignore_errors=True)
+                os.makedirs(os.path.join(dataset_path, folder, "train"))
+                os.makedirs(os.path.join(dataset_path, folder, "val"))
+            
+            class_ids = {}
+            for i, label in enumerate(self.labels):
+                class_ids.setdefault(label, i)
+            
+            # Copy (or transcode) images
+            records, missing_images, stats = self.export_split_images(
+                [("train", train_files), ("val", val_files)], os.path.join(dataset_path, "images")
+            )
+            
+            def write_labels(image_path, split_name, img_width, img_height, annotations):
+                # Write labels with the current class ids
+                classes, boxes = yolo_label_rows(annotations, img_width, img_height, class_ids)
+                name = os.path.splitext(os.path.basename(image_path))[0]
+                label_path = os.path.join(dataset_path, "labels", split_name, f"{name}.txt")
+                with open(label_path, 'w') as f:
+                    for class_id, (center_x, center_y, width, height) in zip(classes, boxes):
+                        f.write(f"{class_id} {center_x:.6f} {center_y:.6f} {width:.6f} {height:.6f}\n")
+                return label_path, classes, boxes
+            
+            augmented = []
+            rendered = 0
+            table_splits = []
+            for split_name, split_records in records.items():
+                cache_entries = []
+                table_rows = []
+                for filename, image_path, (img_width, img_height), _, annotations in split_records:
+                    # Trainers load images upright, so labels follow the EXIF orientation
+                    orientation = read_exif_orientation(image_path)
+                    if orientation in EXIF_TRANSPOSE:
+                        oriented = orient_boxes([annotation['bbox'] for annotation in annotations], orientation, img_width, img_height)
+                        annotations = [dict(annotation, bbox=box) for annotation, box in zip(annotations, oriented)]
+                        if orientation >= 5:
+                            img_width, img_height = img_height, img_width
+                    label_path, classes, boxes = write_labels(image_path, split_name, img_width, img_height, annotations)
+                    cache_entries.append((image_path, label_path, (img_height, img_width), classes, boxes))
+                    table_rows.append((os.path.basename(image_path), [img_width, img_height], annotations))
+                
+                # Offline augmentation of the training split
+                if split_name == "train":
+                    augmented, rendered = self.augment_exported_images(split_records, "yolo")
+                    for name, cached_path, (img_width, img_height), annotations in augmented:
+                        image_path = os.path.join(dataset_path, "images", split_name, name + os.path.splitext(cached_path)[1])
+                        link_or_copy(cached_path, image_path)
+                        label_path, classes, boxes = write_labels(image_path, split_name, img_width, img_height, annotations)
+                        cache_entries.append((image_path, label_path, (img_height, img_width), classes, boxes))
+                        table_rows.append((os.path.basename(image_path), [img_width, img_height], annotations))
+                
+                cache_entries.sort(key=lambda entry: entry[0])
+                write_yolo_label_cache(os.path.join(dataset_path, "labels", f"{split_name}.cache"), cache_entries)
+                table_splits.append((split_name, table_rows))
+            
+            # The same columnar table as the PyTorch export, in the upright pixels of the labels
+            table_path, num_boxes = self.export_annotation_table(dataset_path, table_splits)
+            
+            # classes.txt lets the YOLO importer read this export back
+            write_classes_file(dataset_path, self.labels)
+            
+            # data.yaml (names are JSON-quoted, which is valid YAML)
+            with open(os.path.join(dataset_path, "data.yaml"), 'w') as f:
+                f.write(f"path: {json.dumps(dataset_path)}\n")
+                f.write("train: images/train\n")
+                f.write("val: images/val\n")
+                f.write(f"nc: {len(self.labels)}\n")
+                f.write("names:\n")
+                for i, label in enumerate(self.labels):
+                    f.write(f"  {i}: {json.dumps(label)}\n")
+            
+            messagebox.showinfo(
+                "Success", 
+                f"YOLO dataset exported successfully!\n\n"
+                f"Dataset location: {dataset_path}\n"
+                f"Train images: {len(train_files)}\n"
+                f"Augmented train images: {len(augmented)} ({rendered} rendered, {len(augmented) - rendered} reused)\n"
+                f"Val images: {len(val_files)}\n"
+                f"Missing images: {len(missing_images)}\n"
+                f"Failed images: {len(stats['failed_images'])}\n"
+                f"Classes: {len(self.labels)}\n"
+                f"Image data: {stats['source_bytes'] / 1e6:.1f} MB -> {stats['exported_bytes'] / 1e6:.1f} MB\n\n"
+                f"Files created:\n"
+                f"- data.yaml and classes.txt\n"
+                f"- {os.path.basename(table_path)} ({num_boxes} boxes)\n"
+                f"- images/train/ and images/val/\n"
+                f"- labels/train/ and labels/val/\n"
+                f"- labels/train.cache and labels/val.cache (prebuilt label cache)"
+            )
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export YOLO dataset: {str(e)}")
+    
+    def export_object_crops(self):
+        """Export every labeled box as an image crop for classifier and re-ID training"""
+        try:
+            labeled_files = self.collect_labeled_files()
+            
+            if not labeled_files:
+                messagebox.showwarning("Warning", "No labeled images found")
+                return
+            
+            start_time = time.time()
+            crop_path = os.path.join(self.labeled_path, "crops")
+            shutil.rmtree(crop_path, ignore_errors=True)
+            os.makedirs(crop_path)
+            
+            image_keys = self.resolve_image_keys()
+            class_ids = {}
+            for i, label in enumerate(self.labels):
+                class_ids.setdefault(label, i)
+            sharded = self.crop_layout.get() == "Tar shards"
+            padding = max(0.0, self.crop_padding.get())
+            crop_size = self.crop_size.get()
+            image_format, extension = TRANSCODE_FORMATS.get(self.export_format.get(), TRANSCODE_FORMATS['JPEG'])
+            quality = self.export_quality.get()
+            missing_images = []
+            failed_images = []
+            
+            def image_failed(filename, error):
+                print(f"Error exporting crops of {filename}: {error}")
+                failed_images.append(filename)
+            
+            with tempfile.TemporaryDirectory(prefix="crop_staging_") as staging_dir:
+                def prepare(filename):
+                    # Read the boxes on a thread; archive members and frames are staged as plain files
+                    key = image_keys.get(filename)
+                    if not key:
+                        return filename, None, None
+                    with open(os.path.join(self.labeled_path, f"{filename}.json"), 'r') as f:
+                        annotations = json.load(f)['annotations']
+                    
+                    source_path = os.path.join(self.unlabeled_path, key)
+                    staged = KEY_SEPARATOR in key
+                    if staged:
+                        staging_path = os.path.join(staging_dir, export_image_name(key))
+                        copy_image(source_path, staging_path)
+                        source_path = staging_path
+                    
+                    crops = []
+                    for i, annotation in enumerate(annotations):
+                        dest_path = None
+                        if not sharded:
+                            class_dir = os.path.join(crop_path, crop_folder_name(annotation['label']))
+                            os.makedirs(class_dir, exist_ok=True)
+                            dest_path = os.path.join(class_dir, f"{filename}_{i}{extension}")
+                        crops.append((annotation['bbox'], dest_path))
+                    return filename, annotations, (source_path, crops, padding, crop_size, image_format, quality, staged)
+                
+                in_flight = deque()
+                
+                def jobs():
+                    for prepared in bounded_map(threads, prepare, labeled_files, window=64,
+                                                on_error=image_failed):
+                        if prepared is None:
+                            continue
+                        filename, annotations, job = prepared
+                        if annotations is None:
+                            missing_images.append(filename)
+                            continue
+                        in_flight.append((filename, annotations))
+                        yield job
+                
+                num_crops = 0
+                shard = None
+                with open(os.path.join(crop_path, "manifest.csv"), 'w', newline='') as manifest_file, \
+                        ThreadPoolExecutor(max_workers=8) as threads, process_pool() as processes:
+                    manifest = csv.writer(manifest_file)
+                    manifest.writerow(["file", "class_id", "label", "image", "x1", "y1", "x2", "y2", "width", "height"])
+                    
+                    # Results arrive in order and at most a window of images is in memory
+                    for results in bounded_map(processes, crop_objects, jobs(), window=64, on_error=lambda job, e: e):
+                        filename, annotations = in_flight.popleft()
+                        if isinstance(results, Exception):
+                            image_failed(filename, results)
+                            continue
+                        for i, (annotation, result) in enumerate(zip(annotations, results)):
+                            if result is None:
+                                continue
+                            (width, height), data = result
+                            label = annotation['label']
+                            crop_name = f"{filename}_{i}{extension}"
+                            
+                            if sharded:
+                                if num_crops % CROPS_PER_SHARD == 0:
+                                    if shard:
+                                        shard.close()
+                                    shard_name = f"shard-{num_crops // CROPS_PER_SHARD:06d}.tar"
+                                    shard = tarfile.open(os.path.join(crop_path, shard_name), 'w')
+                                
+                                # WebDataset layout: each crop is an image plus a .json with the same key
+                                metadata = json.dumps({
+                                    "class_id": class_ids.get(label, 0),
+                                    "label": label,
+                                    "image": filename,
+                                    "bbox": annotation['bbox']
+                                }).encode('utf-8')
+                                for member_name, member_data in [(crop_name, data), (f"{filename}_{i}.json", metadata)]:
+                                    info = tarfile.TarInfo(member_name)
+                                    info.size = len(member_data)
+                                    info.mtime = int(start_time)
+                                    shard.addfile(info, io.BytesIO(member_data))
+                                file_name = f"{shard_name}/{crop_name}"
+                            else:
+                                file_name = f"{crop_folder_name(label)}/{crop_name}"
+                            
+                            manifest.writerow([file_name, class_ids.get(label, 0), label, filename,
+                                               *annotation['bbox'], width, height])
+                            num_crops += 1
+                    
+                    if shard:
+                        shard.close()
+            
+            layout = f"{-(-num_crops // CROPS_PER_SHARD)} tar shards" if sharded else "one folder per class"
+            messagebox.showinfo(
+                "Success",
+                f"Object crops exported successfully!\n\n"
+                f"Location: {crop_path}\n"
+                f"Crops: {num_crops} from {len(labeled_files) - len(missing_images) - len(failed_images)} images ({layout})\n"
+                f"Missing images: {len(missing_images)}\n"
+                f"Failed images: {len(failed_images)}\n"
+                f"Time: {time.time() - start_time:.1f} s\n\n"
+                f"Files created:\n"
+                f"- manifest.csv (crop, class and source box per row)"
+            )
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export object crops: {str(e)}")
+    
+    def augment_exported_images(self, exported_train, consumer):
+        """Augment exported training records (stem, image path, size, channels, annotations) per Export Options"""
+        variants = self.augment_variants.get()
+        if variants <= 0 or not exported_train:
+            return [], 0
+        
+        train_entries = [(filename, image_path, annotations) for filename, image_path, _, _, annotations in exported_train]
+        return self.augment_training_set(train_entries, variants, self.augment_seed.get(), consumer, self.augment_recipe())
+    
+    def augment_recipe(self):
+        """Return the augmentation recipe, encoding variants in the chosen export image format"""
+        target = TRANSCODE_FORMATS.get(self.export_format.get())
+        if target is None:
+            return DEFAULT_AUGMENT_RECIPE  # Originals have mixed formats; variants stay JPEG
+        return dict(DEFAULT_AUGMENT_RECIPE, format=target[0], extension=target[1], quality=self.export_quality.get())
+    
+    def augment_training_set(self, train_entries, variants, seed, consumer, recipe=None):
+        """Render seeded augmented variants of the training images on a process pool
+
+        train_entries is a list of (name, image_path, annotations). Variants are
+        cached in Labeled_Data/augment_cache under a fingerprint of the source
+        image bytes, boxes, recipe and seed, so re-exports only render what
+        changed. Each consumer (export kind) records the variants it uses, and
+        only variants no consumer uses are pruned. Returns
+        ([(name, image_path, size, annotations)], rendered count).
+        """
+        recipe = recipe or DEFAULT_AUGMENT_RECIPE
+        cache_dir = os.path.join(self.labeled_path, "augment_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        train_entries = sorted(train_entries, key=lambda entry: entry[0])
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            hashes = list(executor.map(file_sha1, [image_path for _, image_path, _ in train_entries]))
+        
+        def stable_hash(text):
+            return int(hashlib.sha256(text.encode()).hexdigest()[:16], 16)
+        
+        # Mosaic partners are picked on a hash ring of image names, so a variant keeps
+        # its partners when other images are added to or removed from the split
+        ring = sorted((stable_hash(f"{seed}:{name}"), index) for index, (name, _, _) in enumerate(train_entries))
+        ring_keys = [key for key, _ in ring]
+        
+        results = []
+        pending = []
+        for index, (name, image_path, annotations) in enumerate(train_entries):
+            for k in range(variants):
+                variant_seed = stable_hash(f"{seed}:{name}:{k}")
+                rng = random.Random(variant_seed)
+                members = [index]
+                if len(train_entries) >= 4 and rng.random() < recipe['mosaic']:
+                    # Three other training images, skipping this one
+                    for draw in range(3):
+                        position = bisect.bisect(ring_keys, stable_hash(f"{seed}:{name}:{k}:{draw}"))
+                        while ring[position % len(ring)][1] in members:
+                            position += 1
+                        members.append(ring[position % len(ring)][1])
+                
+                sources = []
+                fingerprint_sources = []
+                for member in members:
+                    _, member_path, member_annotations = train_entries[member]
+                    boxes = [annotation['bbox'] for annotation in member_annotations]
+                    labels = [annotation['label'] for annotation in member_annotations]
+                    sources.append((member_path, boxes, labels))
+                    fingerprint_sources.append([hashes[member], boxes, labels])
+                fingerprint = hashlib.sha256(json.dumps(
+                    {'recipe': recipe, 'seed': variant_seed, 'sources': fingerprint_sources}, sort_keys=True
+                ).encode()).hexdigest()[:32]
+                
+                output_path = os.path.join(cache_dir, f"{fingerprint}{recipe['extension']}")
+                meta_path = os.path.join(cache_dir, f"{fingerprint}.json")
+                variant_name = f"{name}_aug{k}"
+                if os.path.exists(output_path) and os.path.exists(meta_path):
+                    with open(meta_path, 'r') as f:
+                        meta = json.load(f)
+                    results.append((variant_name, output_path, meta['size'], meta['annotations']))
+                else:
+                    pending.append((variant_name, output_path, meta_path, (output_path, sources, recipe, variant_seed + 1)))
+        
+        if pending:
+            with process_pool() as executor:
+                rendered = bounded_map(executor, augment_image, [job for *_, job in pending], window=64,
+                                       on_error=lambda job, e: e)
+                for (variant_name, output_path, meta_path, _), result in zip(pending, rendered):
+                    if isinstance(result, Exception):
+                        print(f"Error rendering augmented image {variant_name}: {result}")
+                        continue
+                    size, boxes, labels = result
+                    annotations = [{'label': label, 'bbox': box} for label, box in zip(labels, boxes)]
+                    write_json_atomic(meta_path, {'size': size, 'annotations': annotations})
+                    results.append((variant_name, output_path, size, annotations))
+        
+        # Record what this export uses, then drop variants that no export uses any more
+        write_json_atomic(os.path.join(cache_dir, f"used_by_{consumer}.json"),
+                          sorted(os.path.splitext(os.path.basename(output_path))[0] for _, output_path, _, _ in results))
+        used = set()
+        for file in os.listdir(cache_dir):
+            if file.startswith("used_by_"):
+                with open(os.path.join(cache_dir, file), 'r') as f:
+                    used.update(json.load(f))
+        for file in os.listdir(cache_dir):
+            if not file.startswith("used_by_") and os.path.splitext(file)[0] not in used:
+                os.remove(os.path.join(cache_dir, file))
+        
+        results.sort(key=lambda result: result[0])
+        return results, len(pending)
+    
     def create_pytorch_dataset_loader(self, dataset_path):
         """Create example PyTorch dataset loader code"""
         loader_code = '''import torch
@@ -727,26 +3025,24 @@ class CustomObjectDetectionDataset(Dataset):
         with open(os.path.join(root_dir, 'dataset_info.json'), 'r') as f:
             self.dataset_info = json.load(f)
         
-        # Get image files
-        self.image_files = [f for f in os.listdir(self.images_dir) 
-                           if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        # One PyTorch-format annotation file per image; it names the image file,
+        # whatever format the export wrote it in
+        self.annotation_files = sorted(f for f in os.listdir(self.annotations_dir)
+                                       if f.endswith('_pytorch.json'))
         
     def __len__(self):
-        return len(self.image_files)
+        return len(self.annotation_files)
     
     def __getitem__(self, idx):
-        # Load image
-        img_name = self.image_files[idx]
-        img_path = os.path.join(self.images_dir, img_name)
-        image = Image.open(img_path).convert('RGB')
-        
         # Load annotations (PyTorch format)
-        base_name = os.path.splitext(img_name)[0]
-        ann_path = os.path.join(self.annotations_dir, f"{base_name}_pytorch.json")
-        
+        ann_path = os.path.join(self.annotations_dir, self.annotation_files[idx])
         with open(ann_path, 'r') as f:
             annotations = json.load(f)
         
+        # Load image
+        img_path = os.path.join(self.images_dir, annotations['image_info']['filename'])
+        image = Image.open(img_path).convert('RGB')
+        
         # Extract bboxes and labels
         boxes = []
         labels = []
@@ -866,7 +3162,7 @@ if __name__ == "__main__":
         if not self.current_image_path:
             return
             
-        filename = os.path.splitext(os.path.basename(self.current_image_path))[0]
+        filename = annotation_stem(self.current_image_key)
         json_path = os.path.join(self.labeled_path, f"{filename}.json")
         
         if os.path.exists(json_path):
@@ -876,10 +3172,11 @@ if __name__ == "__main__":
                 
                 # Load labels if they exist
                 if 'labels' in data and data['labels']:
-                    for label in data['labels']:
-                        if label not in self.labels:
-                            self.labels.append(label)
-                            self.labels_listbox.insert(tk.END, label)
+                    with self.annotation_index.lock:
+                        for label in data['labels']:
+                            if label not in self.labels:
+                                self.labels.append(label)
+                    self.refresh_labels_listbox()
                 
                 # Load annotations
                 for annotation in data['annotations']:
@@ -909,8 +3206,289 @@ if __name__ == "__main__":
                 
             except Exception as e:
                 print(f"Error loading existing annotations: {e}")
+    
+    def propagate_previous_boxes(self):
+        """Add the previous frame's boxes, refined by template tracking, as editable proposals
+
+        Returns the number of boxes that could not be tracked confidently.
+        """
+        prev_image, annotations = self.propagation_source
+        try:
+            results = propagate_boxes(prev_image, self.current_image, [bbox for _, bbox in annotations])
+        except Exception as e:
+            print(f"Error propagating boxes: {e}")
+            return 0
+        
+        low_confidence = 0
+        for (label, _), (bbox, score) in zip(annotations, results):
+            x1, y1, x2, y2 = bbox
+            
+            # Dashed orange outline marks proposals until they are reviewed and saved;
+            # boxes that could not be tracked confidently stay in place, dotted in yellow
+            tracked = score >= TRACKING_MIN_SCORE
+            rect_id = self.canvas.create_rectangle(
+                x1 * self.image_scale, y1 * self.image_scale,
+                x2 * self.image_scale, y2 * self.image_scale,
+                outline="orange" if tracked else "yellow", width=2,
+                dash=(4, 2) if tracked else (1, 3), tags="annotation"
+            )
+            self.rectangles.append({
+                'label': label,
+                'bbox': [x1, y1, x2, y2],
+                'canvas_id': rect_id,
+                'low_confidence': not tracked
+            })
+            low_confidence += not tracked
+        
+        self.update_annotations_list()
+        return low_confidence
+    
+    def import_coco_dataset(self):
+        """Import annotations from a COCO JSON file"""
+        json_path = filedialog.askopenfilename(
+            title="Select a COCO annotation file",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if json_path:
+            self.run_import("COCO", self.import_coco, json_path)
+    
+    def import_voc_dataset(self):
+        """Import annotations from a folder of Pascal VOC XML files"""
+        folder = filedialog.askdirectory(title="Select a Pascal VOC annotation folder")
+        if folder:
+            self.run_import("Pascal VOC", self.import_voc, folder)
+    
+    def import_yolo_dataset(self):
+        """Import annotations from a folder of YOLO .txt files with classes.txt"""
+        folder = filedialog.askdirectory(title="Select a YOLO label folder")
+        if folder:
+            self.run_import("YOLO", self.import_yolo, folder)
+    
+    def run_import(self, format_name, importer, source):
+        """Run an importer and report the result"""
+        try:
+            self.status_var.set(f"Importing {format_name} annotations...")
+            self.root.update_idletasks()
+            outcomes = importer(source)
+            self.refresh_labels_listbox()
+            count = outcomes.get('written', 0)
+            self.status_var.set(f"Imported {format_name} annotations for {count} images")
+            messagebox.showinfo(
+                "Success",
+                f"{format_name} annotations imported successfully!\n\n"
+                f"Images: {count}\n"
+                f"Skipped, already labeled: {outcomes.get('labeled', 0)}\n"
+                f"Skipped, leased by a labeler: {outcomes.get('leased', 0)}\n"
+                f"Skipped, image not found: {outcomes.get('missing', 0)}\n"
+                f"Classes: {len(self.labels)}\n\n"
+                f"Place the matching images in {self.unlabeled_path}/ to review them."
+            )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to import {format_name} annotations: {str(e)}")
+    
+    def register_labels(self, names):
+        """Append any unseen class names to the label list"""
+        with self.annotation_index.lock:
+            for name in names:
+                if name not in self.labels:
+                    self.labels.append(name)
+    
+    def write_imported_record(self, record):
+        """Write one imported (name, image_path, image_size, annotations) record, returning the outcome
+
+        Images that already have annotations or are leased by a labeler are
+        skipped, never overwritten. A missing image_size is read from the image.
+        """
+        name, image_path, image_size, annotations = record
+        if name in self.import_leased:
+            return 'leased'
+        if os.path.exists(os.path.join(self.labeled_path, f"{name}.json")):
+            return 'labeled'
+        if not image_size or not all(image_size):
+            if not os.path.exists(image_path):
+                return 'missing'
+            image_size = read_image_size(image_path)
+        
+        self.register_labels(annotation['label'] for annotation in annotations)
+        annotations_data = {
+            'image_path': image_path,
+            'image_size': list(image_size),
+            'labels': list(self.labels),
+            'annotations': annotations
+        }
+        write_yolo_annotations(self.labeled_path, name, annotations_data, annotations_data['labels'])
+        self.annotation_index.update(name, annotations_data)
+        return 'written'
+    
+    def import_in_parallel(self, fn, items):
+        """Apply fn to items on a thread pool with bounded memory, returning {outcome: count}"""
+        # Leases are read once up front; the work queue connection belongs to the Tk thread
+        self.import_leased = {annotation_stem(image) for image in self.work_queue.leases()}
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for outcome in bounded_map(executor, fn, items, window=64):
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        write_classes_file(self.labeled_path, self.labels)
+        return outcomes
+    
+    def import_coco(self, json_path):
+        """Stream a COCO JSON file of any size into per-image annotation records"""
+        # Spill images and annotations into buckets by image id, so grouping
+        # annotations per image only ever holds one bucket in memory
+        num_buckets = max(1, min(256, os.path.getsize(json_path) // (16 << 20)))
+        categories = {}
+        
+        with tempfile.TemporaryDirectory(prefix="coco_import_") as tmp_dir:
+            bucket_paths = [os.path.join(tmp_dir, f"{i}.jsonl") for i in range(num_buckets)]
+            buckets = [open(path, 'w') for path in bucket_paths]
+            try:
+                for key, item in iter_json_array_items(json_path, {"images", "annotations", "categories"}):
+                    if key == "categories":
+                        categories[item["id"]] = item["name"]
+                    elif key == "images":
+                        row = ["i", item["id"], item["file_name"], item.get("width", 0), item.get("height", 0)]
+                        buckets[hash(item["id"]) % num_buckets].write(json.dumps(row) + "\n")
+                    else:
+                        row = ["a", item["image_id"], item["category_id"], item["bbox"]]
+                        buckets[hash(item["image_id"]) % num_buckets].write(json.dumps(row) + "\n")
+            finally:
+                for bucket in buckets:
+                    bucket.close()
+            
+            # Keep the COCO category order for class ids
+            self.register_labels(categories[category_id] for category_id in sorted(categories))
+            
+            def records():
+                for bucket_path in bucket_paths:
+                    images = {}
+                    annotations = {}
+                    with open(bucket_path, 'r') as f:
+                        for line in f:
+                            row = json.loads(line)
+                            if row[0] == "i":
+                                images[row[1]] = row[2:]
+                            else:
+                                x, y, width, height = row[3]
+                                annotations.setdefault(row[1], []).append({
+                                    'label': categories.get(row[2], str(row[2])),
+                                    'bbox': [x, y, x + width, y + height]
+                                })
+                    
+                    for image_id, (file_name, width, height) in images.items():
+                        name = annotation_stem(os.path.basename(file_name))
+                        image_path = os.path.join(self.unlabeled_path, file_name)
+                        yield name, image_path, [width, height], annotations.get(image_id, [])
+            
+            return self.import_in_parallel(self.write_imported_record, records())
+    
+    def import_voc(self, folder):
+        """Import every Pascal VOC XML file under folder"""
+        def xml_files():
+            for dirpath, _, filenames in os.walk(folder):
+                for file in sorted(filenames):
+                    if file.lower().endswith('.xml'):
+                        yield os.path.join(dirpath, file)
+        
+        return self.import_in_parallel(self.import_voc_file, xml_files())
+    
+    def import_voc_file(self, xml_path):
+        """Parse and write one Pascal VOC XML file"""
+        filename, size, objects = parse_voc_file(xml_path)
+        image_path = os.path.join(self.unlabeled_path, filename)
+        name = annotation_stem(os.path.basename(filename))
+        annotations = [{'label': label, 'bbox': bbox} for label, bbox in objects]
+        return self.write_imported_record((name, image_path, size, annotations))
+    
+    def import_yolo(self, folder):
+        """Import YOLO .txt labels under folder, using the nearest classes.txt for names"""
+        # classes.txt usually sits in the label folder or the dataset root above labels/train
+        classes = []
+        directory = os.path.abspath(folder)
+        for _ in range(3):
+            classes = read_classes_file(directory)
+            if classes:
+                break
+            directory = os.path.dirname(directory)
+        if not classes:
+            raise ValueError(f"No classes.txt found in {folder} or the two folders above it")
+        self.register_labels(classes)
+        
+        def label_files():
+            for dirpath, _, filenames in os.walk(folder):
+                for file in sorted(filenames):
+                    if file.endswith('.txt') and file != 'classes.txt':
+                        yield os.path.join(dirpath, file)
+        
+        return self.import_in_parallel(lambda txt_path: self.import_yolo_file(txt_path, classes), label_files())
+    
+    def import_yolo_file(self, txt_path, classes):
+        """Parse and write one YOLO .txt label file, skipping it if its image cannot be found"""
+        name = os.path.splitext(os.path.basename(txt_path))[0]
+        
+        # Images sit next to the labels, in a parallel images/ tree, or in the unlabeled folder
+        label_dir = os.path.dirname(txt_path)
+        parts = label_dir.split(os.sep)
+        search_dirs = [label_dir]
+        if 'labels' in parts:
+            index = len(parts) - 1 - parts[::-1].index('labels')
+            search_dirs.append(os.sep.join(parts[:index] + ['images'] + parts[index + 1:]))
+        search_dirs.append(self.unlabeled_path)
+        
+        image_path = None
+        for directory in search_dirs:
+            for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']:
+                for candidate in (f"{name}{ext}", f"{name}{ext.upper()}"):
+                    if os.path.exists(os.path.join(directory, candidate)):
+                        image_path = os.path.join(directory, candidate)
+                        break
+                if image_path:
+                    break
+            if image_path:
+                break
+        if image_path is None:
+            return 'missing'
+        name = annotation_stem(os.path.basename(image_path))
+        
+        # YOLO labels are normalized to the upright image; boxes are stored on the raw pixels
+        with Image.open(image_path) as img:
+            raw_width, raw_height = img.size
+        orientation = read_exif_orientation(image_path)
+        img_width, img_height = (raw_height, raw_width) if orientation >= 5 else (raw_width, raw_height)
+        annotations = []
+        with open(txt_path, 'r') as f:
+            for line in f:
+                values = line.split()
+                if len(values) < 5:
+                    continue
+                class_id = int(values[0])
+                center_x, center_y, width, height = (float(v) for v in values[1:5])
+                label = classes[class_id] if class_id < len(classes) else str(class_id)
+                annotations.append({
+                    'label': label,
+                    'bbox': [
+                        (center_x - width / 2) * img_width,
+                        (center_y - height / 2) * img_height,
+                        (center_x + width / 2) * img_width,
+                        (center_y + height / 2) * img_height
+                    ]
+                })
+        
+        if orientation in EXIF_TRANSPOSE:
+            raw_boxes = orient_boxes([annotation['bbox'] for annotation in annotations],
+                                     EXIF_INVERSE_ORIENTATION[orientation], img_width, img_height)
+            annotations = [dict(annotation, bbox=box) for annotation, box in zip(annotations, raw_boxes)]
+        return self.write_imported_record((name, image_path, [raw_width, raw_height], annotations))
 
 def main():
+    parser = argparse.ArgumentParser(description="YOLO Data Labeler")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="only run the annotation API on PORT, without the GUI")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve_annotations("Labeled_Data", args.serve)
+        return
+    
     root = tk.Tk()
     app = DataLabeler(root)
     root.mainloop()